@@ -0,0 +1,206 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import subprocess
+import tempfile
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from tecplotIO import TecplotBinaryReader, TecplotBinaryWriter, PltStats
+
+# (imax, jmax, kmax) of the synthetic ordered grids
+SIZES = {
+    'tiny': (8, 8, 8),
+    'small': (64, 64, 64),
+    'medium': (256, 256, 128),
+    'large': (512, 512, 256),
+    'huge': (1024, 1024, 512),
+}
+
+# variable locations of the synthetic datasets
+LAYOUTS = {
+    'vertex': lambda nVars: [0]*nVars,
+    # up to three grid variables at the vertices, always at least one cell-centered variable
+    'mixed': lambda nVars: [0]*min(3, nVars-1) + [1]*(nVars-min(3, nVars-1)),
+}
+
+
+def make_vars(shape, varsLoc, dtype):
+    imax, jmax, kmax = shape
+    cells = (max(imax-1, 1), max(jmax-1, 1), max(kmax-1, 1))
+    rng = np.random.default_rng(0)
+    return [rng.random(shape if loc == 0 else cells, dtype=dtype) for loc in varsLoc]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on linux and in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss/2**20 if sys.platform == 'darwin' else rss/2**10
+
+
+def run_case(case, tmpdir):
+    '''
+    write and read one synthetic dataset, return the end-to-end timings of the default
+    writer, the streaming writer, the eager reader and the lazy reader, and the phase
+    timings and I/O counters of every one of them
+    '''
+    shape = SIZES[case['size']]
+    varsLoc = LAYOUTS[case['layout']](case['nVars'])
+    dtype = np.float64 if case['format'] == 'd' else np.float32
+    vars = make_vars(shape, varsLoc, dtype)
+    rssData = peak_rss_mb()
+    filename = os.path.join(tmpdir, 'bench_{:d}.plt'.format(os.getpid()))
+
+    result = dict(case)
+    # the default writer, every variable at once
+    stats = PltStats()
+    t0 = time.perf_counter()
+    TecplotBinaryWriter(filename, vars, varsLoc=varsLoc, dataFormat=case['format'],
+                        workers=case['workers'], stats=stats)
+    t1 = time.perf_counter()
+    result.update(writeSeconds=t1-t0, writeStats=stats.as_dict())
+
+    # the streaming writer, a head section then one slab per variable
+    stats = PltStats()
+    t0 = time.perf_counter()
+    writer = TecplotBinaryWriter(filename, varsLoc=varsLoc, dataFormat=case['format'],
+                                 shape=shape, workers=case['workers'], stats=stats)
+    t1 = time.perf_counter()
+    if case['workers'] is None:
+        for i, var in enumerate(vars):
+            writer.write_slab(i, 0, var)
+    else:
+        with ThreadPoolExecutor(max_workers=case['workers']) as pool:
+            list(pool.map(writer.write_slab, range(len(vars)), [0]*len(vars), vars))
+    t2 = time.perf_counter()
+    writer.close()
+    t3 = time.perf_counter()
+    result.update(streamWriteHeadSeconds=t1-t0, streamWriteDataSeconds=t2-t1,
+                  streamWriteCloseSeconds=t3-t2, streamWriteSeconds=t3-t0,
+                  streamWriteStats=stats.as_dict())
+    del vars
+    fileBytes = os.path.getsize(filename)
+    result['fileMB'] = fileBytes/2**20
+
+    # the eager reader, every variable decoded by the constructor
+    stats = PltStats()
+    t0 = time.perf_counter()
+    reader = TecplotBinaryReader(filename, stats=stats)
+    t1 = time.perf_counter()
+    reader.close()
+    del reader
+    result.update(readSeconds=t1-t0, readStats=stats.as_dict())
+
+    # the lazy reader, the head section then every variable on access
+    stats = PltStats()
+    t0 = time.perf_counter()
+    reader = TecplotBinaryReader(filename, lazy=True, stats=stats)
+    t1 = time.perf_counter()
+    data = reader.get_data_list()
+    t2 = time.perf_counter()
+    reader.close()
+    del data
+    result.update(lazyReadHeadSeconds=t1-t0, lazyReadDataSeconds=t2-t1, lazyReadSeconds=t2-t0,
+                  lazyReadStats=stats.as_dict())
+
+    for mode in ('write', 'streamWrite', 'read', 'lazyRead'):
+        result[mode + 'MBps'] = result['fileMB']/result[mode + 'Seconds']
+    result['dataPeakRssMB'] = rssData
+    result['peakRssMB'] = peak_rss_mb()
+    os.remove(filename)
+    return result
+
+
+def _run_case_in_child(args):
+    return run_case(*args)
+
+
+def environment():
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = ''
+    return {'commit': commit, 'python': platform.python_version(),
+            'numpy': np.__version__, 'machine': platform.machine()}
+
+
+def case_key(case):
+    return '{size}/{layout}/{format}/{nVars}'.format(**case)
+
+
+def compare(results, baseline):
+    '''
+    print the relative change of the throughputs and peak memory against a baseline run
+    '''
+    old = {case_key(r): r for r in baseline['results']}
+    keys = ['writeMBps', 'streamWriteMBps', 'readMBps', 'lazyReadMBps', 'peakRssMB']
+    print('{:32s} {:>10s} {:>10s} {:>10s} {:>10s} {:>10s}'.format(
+        'case', 'write', 'stream', 'read', 'lazy', 'peakRss'))
+    for r in results:
+        b = old.get(case_key(r))
+        if b is None:
+            continue
+        print('{:32s}'.format(case_key(r)) + ''.join(
+            ' {:>+9.1f}%'.format(100*(r[key]/b[key]-1)) if key in b else ' {:>10s}'.format('-')
+            for key in keys))
+
+
+def print_phases(r):
+    '''
+    print the seconds of every phase of the writers and readers of a case
+    '''
+    for mode in ('write', 'streamWrite', 'read', 'lazyRead'):
+        stats = r[mode + 'Stats']
+        print('    {:12s}'.format(mode) + ''.join(
+            ' {} {:.4f} s'.format(phase, seconds) for phase, seconds in stats['seconds'].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='tecplotIO read/write benchmark')
+    parser.add_argument('--sizes', nargs='+', default=['tiny', 'small'], choices=list(SIZES))
+    parser.add_argument('--layouts', nargs='+', default=list(LAYOUTS), choices=list(LAYOUTS))
+    parser.add_argument('--formats', nargs='+', default=['f', 'd'], choices=['f', 'd'])
+    parser.add_argument('--nvars', nargs='+', type=int, default=[1, 8])
+    parser.add_argument('--workers', type=int, default=None,
+                        help='write the variables concurrently with this many threads')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--phases', action='store_true', help='print the seconds of every phase')
+    parser.add_argument('--tmpdir', default=tempfile.gettempdir())
+    parser.add_argument('--output', default='bench_output.json')
+    parser.add_argument('--compare', default=None, help='json output of a baseline run')
+    args = parser.parse_args()
+
+    cases = [{'size': size, 'layout': layout, 'format': fmt, 'nVars': nVars, 'workers': args.workers}
+             for size in args.sizes for layout in args.layouts
+             for fmt in args.formats for nVars in args.nvars]
+    # every case runs in a fresh process so that its peak RSS is its own
+    ctx = multiprocessing.get_context('spawn')
+    results = []
+    for case in cases:
+        for _ in range(args.repeat):
+            with ctx.Pool(1) as pool:
+                r = pool.apply(_run_case_in_child, ((case, args.tmpdir),))
+            results.append(r)
+            print('{:32s} {:9.1f} MB  write {:8.1f} MB/s  stream {:8.1f} MB/s  read {:8.1f} MB/s  '
+                  'lazy {:8.1f} MB/s  peak {:8.1f} MB'.format(
+                      case_key(r), r['fileMB'], r['writeMBps'], r['streamWriteMBps'], r['readMBps'],
+                      r['lazyReadMBps'], r['peakRssMB']))
+            if args.phases:
+                print_phases(r)
+
+    report = {'environment': environment(), 'results': results}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=1)
+    if args.compare is not None:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,5 +5,10 @@ setup(name="tecplotIO",
       description="a simple tecplot ordered data API",
       author="gxw13131",
       license="MIT",
-      py_modules=["tecplotIO.pltFile", "tecplotIO.tecplotIO"],
+      py_modules=["tecplotIO.pltFile", "tecplotIO.tecplotIO", "tecplotIO.pltSeries",
+                  "tecplotIO.pltIndex", "tecplotIO.pltScan",
+                  "tecplotIO.pltStats", "tecplotIO.pltAppend",
+                  "tecplotIO.pltPool", "tecplotIO.pltShared",
+                  "tecplotIO.pltDataset", "tecplotIO.pltReduce",
+                  "tecplotIO.pltAsync", "tecplotIO.pltPyramid"],
       zip_safe=False)
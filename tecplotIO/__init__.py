@@ -1 +1,11 @@
-from .tecplotIO import TecplotBinaryReader, TecplotBinaryWriter
\ No newline at end of file
+from .tecplotIO import TecplotBinaryReader, TecplotBinaryWriter, average_to_center, average_to_vertex
+from .pltAppend import append_zone
+from .pltStats import PltStats
+from .pltPool import HandlePool
+from .pltShared import SharedField
+from .pltDataset import PltDataset, VariableCache
+from .pltSeries import read_series, reduce_series
+from .pltReduce import Reduction, PointwiseReduction
+from .pltAsync import AsyncTecplotReader, open_plt
+from .pltPyramid import build_pyramid, read_lod
+from .pltScan import ZoneSummary, scan, select
\ No newline at end of file
@@ -0,0 +1,120 @@
+# -*- coding:utf8 -*-
+import os
+import shutil
+from .tecplotIO import TecplotBinaryReader, TecplotBinaryWriter
+
+
+def _copy_range(src, dst, srcOffset, dstOffset, count):
+    '''
+    copy count bytes between two file descriptors inside the kernel,
+    copy_file_range may share the blocks on file systems supporting reflinks.
+    '''
+    if hasattr(os, 'copy_file_range'):
+        while count > 0:
+            try:
+                n = os.copy_file_range(src, dst, count, srcOffset, dstOffset)
+            except OSError:
+                # e.g. across file systems on old kernels
+                break
+            if n == 0:
+                break
+            srcOffset += n
+            dstOffset += n
+            count -= n
+    if count > 0 and hasattr(os, 'sendfile'):
+        os.lseek(dst, dstOffset, os.SEEK_SET)
+        while count > 0:
+            n = os.sendfile(dst, src, srcOffset, count)
+            if n == 0:
+                break
+            srcOffset += n
+            dstOffset += n
+            count -= n
+    if count > 0:
+        with os.fdopen(os.dup(src), 'rb') as fsrc, os.fdopen(os.dup(dst), 'r+b') as fdst:
+            fsrc.seek(srcOffset)
+            fdst.seek(dstOffset)
+            shutil.copyfileobj(fsrc, fdst, count)
+
+
+def _zone_spec(reader, z):
+    '''
+    zone dict of TecplotBinaryWriter describing an existing zone
+    '''
+    names = reader.variablesName
+    return {
+        'shape': (z.imax, z.jmax, z.kmax),
+        'varsLoc': list(z.variablesLocation),
+        'dataFormat': list(z.variablesDtype),
+        'dataPacking': 'point' if z.datapacking else 'block',
+        'name': z.name,
+        'strandId': z.strand_id,
+        'solutionTime': z.solutiontime,
+        'passiveVars': [names[i] for i, p in enumerate(z.passiveVariables) if p],
+        'sharedVars': {names[i]: s for i, s in enumerate(z.sharingVariables) if s >= 0},
+    }
+
+
+def append_zone(path, vars, varsLoc=None, dataFormat=None, name=None, strandId=-1, solutionTime=0.0,
+                sharedVars=None, passiveVars=None):
+    '''
+    append an ordered zone, e.g. a new time step, to an existing plt file.
+    only the head section is rewritten, the data sections of the existing zones are
+    moved with kernel-side copies and the data of the new zone is streamed at the end.
+    a symbolic link is followed, the file it points to is replaced and keeps its permissions.
+    parameters:
+        path     :  string, the plt file
+        vars     :  list of numpy nd-array, one per variable of the file, the entries
+                    of shared and passive variables may be None
+        varsLoc, dataFormat : as in TecplotBinaryWriter, default is those of the last zone
+        name, strandId, solutionTime : header of the new zone
+        sharedVars, passiveVars : as in the zones of TecplotBinaryWriter, e.g.
+                    sharedVars={'x': 0, 'y': 0, 'z': 0} to reuse the grid of the first zone
+    '''
+    reader = TecplotBinaryReader(path, lazy=True)
+    last = reader.zone[-1]
+    zones = [_zone_spec(reader, z) for z in reader.zone]
+    shared = [reader.variablesName.index(v) if isinstance(v, str) else v
+              for v in (sharedVars or {})]
+    passive = [reader.variablesName.index(v) if isinstance(v, str) else v
+               for v in (passiveVars or [])]
+    stored = [var is not None and i not in shared and i not in passive for i, var in enumerate(vars)]
+    zones.append({
+        # the shape of a zone without stored variables is the one of the last zone
+        'vars': vars if any(stored) else None,
+        'shape': (last.imax, last.jmax, last.kmax),
+        'varsLoc': list(varsLoc if varsLoc is not None else last.variablesLocation),
+        'dataFormat': dataFormat if dataFormat is not None else list(last.variablesDtype),
+        'name': name if name is not None else 'Zone {:d}'.format(len(zones)+1),
+        'strandId': strandId,
+        'solutionTime': solutionTime,
+        'sharedVars': sharedVars or {},
+        'passiveVars': passiveVars or [],
+    })
+
+    # the new file is renamed over the target of a link, in the directory of the target
+    target = os.path.realpath(path)
+    tmpPath = '{}.{:d}.append'.format(target, os.getpid())
+    try:
+        # the head section and the data of the new zone are written to a new file
+        writer = TecplotBinaryWriter(tmpPath, varsName=reader.variablesName, title=reader.title,
+                                     zones=zones)
+        for old, new in zip(reader.zone, writer.zone):
+            shift = writer.dataSectionOffset - reader.dataSectionOffset
+            if any(o is not None and n - o != shift
+                   for o, n in zip(old.variablesOffset, new.variablesOffset)):
+                raise ValueError("the data section of {} is not contiguous".format(path))
+            new.min_value = list(old.min_value)
+            new.max_value = list(old.max_value)
+        # the data sections of the existing zones are moved as they are
+        writer.pltFile.flush()
+        _copy_range(reader.pltFile.fileno(), writer.pltFile.fileno(), reader.dataSectionOffset,
+                    writer.dataSectionOffset, reader.dataSectionEnd - reader.dataSectionOffset)
+        writer.close()
+        reader.close()
+        shutil.copymode(target, tmpPath)
+        os.replace(tmpPath, target)
+    finally:
+        reader.close()
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
@@ -0,0 +1,95 @@
+# -*- coding:utf8 -*-
+import asyncio
+import weakref
+from functools import partial
+from .tecplotIO import TecplotBinaryReader
+
+# default bound of the blocking calls in flight in an event loop
+__ASYNC_LIMIT__ = 32
+
+_limits = weakref.WeakKeyDictionary()
+
+
+def _default_limit():
+    loop = asyncio.get_running_loop()
+    limit = _limits.get(loop)
+    if limit is None:
+        limit = _limits[loop] = asyncio.Semaphore(__ASYNC_LIMIT__)
+    return limit
+
+
+async def _run(limit, executor, func, *args, **kwargs):
+    '''
+    run a blocking call in the executor once the semaphore limit lets it in
+    '''
+    async with limit:
+        return await asyncio.get_running_loop().run_in_executor(executor, partial(func, *args, **kwargs))
+
+
+class AsyncTecplotReader(TecplotBinaryReader):
+    '''lazy TecplotBinaryReader with coroutines running its reads off the event loop.
+    the reads of one file are serialized, those of different files overlap.
+    it is created by open_plt, or directly, which parses the head section on the spot.
+    the synchronous accessors of the head section are available as well, they do no I/O.
+    '''
+
+    def __init__(self, filename, limit=None, executor=None, **kwargs):
+        kwargs.setdefault('lazy', True)
+        TecplotBinaryReader.__init__(self, filename, **kwargs)
+        self.limit = limit
+        self.executor = executor
+        self.lock = None
+
+    async def _call(self, func, *args, **kwargs):
+        if self.limit is None:
+            # built directly rather than by open_plt
+            self.limit = _default_limit()
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            return await _run(self.limit, self.executor, func, *args, **kwargs)
+
+    async def aread(self, var, zone=0):
+        '''
+        variable given by name or index, decoded as reader[zone, var]
+        '''
+        return await self._call(self.__getitem__, (zone, var))
+
+    async def aread_slab(self, var, i=slice(None), j=slice(None), k=slice(None), zone=0):
+        '''
+        sub-box [i, j, k] of a variable, see read
+        '''
+        return await self._call(self.read, var, i, j, k, zone)
+
+    async def areduce(self, var, ops=('mean',), **kwargs):
+        '''
+        statistics of a variable, see reduce
+        '''
+        return await self._call(self.reduce, var, ops, **kwargs)
+
+    async def aclose(self):
+        await self._call(self.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+
+async def open_plt(filename, limit=None, executor=None, **kwargs):
+    '''
+    open a plt file without blocking the event loop, the head section is parsed in the executor.
+    parameters:
+        filename :  as in TecplotBinaryReader
+        limit    :  asyncio.Semaphore bounding the blocking calls in flight of the reader,
+                    default is a semaphore of 32 shared in the event loop
+        executor :  concurrent.futures executor of the blocking calls, default is the one
+                    of the event loop
+        kwargs   :  arguments of TecplotBinaryReader, lazy is True by default
+    return:
+        AsyncTecplotReader
+    '''
+    if limit is None:
+        limit = _default_limit()
+    return await _run(limit, executor, AsyncTecplotReader, filename, limit, executor, **kwargs)
@@ -0,0 +1,177 @@
+# -*- coding:utf8 -*-
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from .tecplotIO import TecplotBinaryReader
+from .pltPool import HandlePool
+
+
+class VariableCache(object):
+    '''LRU cache of decoded variables with a byte budget, it may be shared by datasets.
+    the cached arrays are read-only, a variable larger than the budget is not cached.
+    attributes:
+        maxBytes :  int, byte budget of the cached arrays
+        nbytes   :  int, bytes of the cached arrays
+        hits, misses, evictions : int, counters of the lookups and of the evicted arrays
+    '''
+
+    def __init__(self, maxBytes=1 << 30):
+        self.maxBytes = maxBytes
+        self.arrays = OrderedDict()
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.arrays.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def get(self, key):
+        '''
+        cached array of key, None on a miss
+        '''
+        with self.lock:
+            array = self.arrays.get(key)
+            if array is None:
+                self.misses += 1
+                return None
+            self.arrays.move_to_end(key)
+            self.hits += 1
+            return array
+
+    def put(self, key, array):
+        '''
+        cache an array, the least recently used arrays are evicted to stay in the budget
+        '''
+        array.flags.writeable = False
+        with self.lock:
+            if key in self.arrays or array.nbytes > self.maxBytes:
+                return
+            while self.arrays and self.nbytes + array.nbytes > self.maxBytes:
+                _, old = self.arrays.popitem(last=False)
+                self.nbytes -= old.nbytes
+                self.evictions += 1
+            self.arrays[key] = array
+            self.nbytes += array.nbytes
+
+    def __len__(self):
+        return len(self.arrays)
+
+    def __repr__(self):
+        return "VariableCache({:d} arrays, {:d} of {:d} bytes, {:d} hits, {:d} misses, {:d} evictions)".format(
+            len(self.arrays), self.nbytes, self.maxBytes, self.hits, self.misses, self.evictions)
+
+
+class PltDataset(object):
+    '''a series of plt snapshots as one (time, variable, i, j, k) collection.
+    the head section of a file is read on its first access, a variable is decoded
+    on demand and kept in the cache.
+    e.g. ds[10, 'T'], ds[10, 'T', :, 5, 0] or ds[:, 'T', 3, 4, 5] for the time history of a point.
+    initialization parameters:
+        paths    :  list of string, plt files of the series, in time order unless sortBy is given
+        zone     :  int or string, zone of every file, default is the first one
+        cacheBytes : int, byte budget of the cache of decoded variables
+        cache    :  VariableCache, cache shared with other datasets, cacheBytes is then ignored
+        pool     :  HandlePool, open files of the readers, default is a pool of 64 files
+        index    :  bool, use the sidecar index of the files, see TecplotBinaryReader
+        sortBy   :  None, 'solutiontime' or 'strand_id', sort the files by a zone header entry,
+                    which reads every head section at once
+    '''
+
+    def __init__(self, paths, zone=0, cacheBytes=1 << 30, cache=None, pool=None, index=False,
+                 sortBy=None):
+        self.paths = [os.path.abspath(path) for path in paths]
+        self.zone = zone
+        self.cache = cache if cache is not None else VariableCache(cacheBytes)
+        self.pool = pool if pool is not None else HandlePool(64)
+        self.index = index
+        self.readers = [None]*len(self.paths)
+        self.lock = threading.Lock()
+        # the decoding of a file seeks and reads its handle, one thread at a time
+        self.readLocks = [threading.Lock() for _ in self.paths]
+        if sortBy is not None:
+            if sortBy not in ('solutiontime', 'strand_id'):
+                raise ValueError("sortBy should be 'solutiontime' or 'strand_id', got {}".format(sortBy))
+            keys = [getattr(self.get_reader(t).get_zone(zone), sortBy) for t in range(len(self))]
+            order = sorted(range(len(self)), key=lambda t: keys[t])
+            self.paths = [self.paths[t] for t in order]
+            self.readers = [self.readers[t] for t in order]
+
+    def __len__(self):
+        return len(self.paths)
+
+    def get_reader(self, t):
+        '''
+        lazy reader of time step t, its head section is read on first use
+        '''
+        with self.lock:
+            reader = self.readers[t]
+            if reader is None:
+                reader = self.readers[t] = TecplotBinaryReader(
+                    self.paths[t], lazy=True, index=self.index, pool=self.pool)
+            return reader
+
+    def get_name_list(self):
+        return self.get_reader(0).get_name_list()
+
+    def solution_times(self):
+        '''
+        solution time of every time step, every head section is read
+        '''
+        return np.array([self.get_reader(t).get_zone(self.zone).solutiontime for t in range(len(self))])
+
+    def read(self, t, var):
+        '''
+        read-only array of a variable, given by name or index, at time step t
+        '''
+        reader = self.get_reader(t)
+        z = reader.get_zone(self.zone)
+        varIdx = reader.variablesName.index(var) if isinstance(var, str) else var
+        key = (self.paths[t], reader.zone.index(z), varIdx)
+        array = self.cache.get(key)
+        if array is None:
+            if z.passiveVariables[varIdx]:
+                array = z.passive_variable(varIdx)
+            else:
+                # decoded into an array of its own so that the cache accounts for every byte
+                array = np.empty(z.variable_shape(varIdx), dtype=z.variablesDtype[varIdx], order='F')
+                with self.readLocks[t]:
+                    z.read_variable(varIdx, reader.pltFile, out=array)
+                    # the points of a POINT zone are not kept outside of the cache
+                    z.points = None
+            self.cache.put(key, array)
+        return array
+
+    def __getitem__(self, key):
+        '''
+        ds[t, var] or ds[t, var, i, j, k], t is an index, a slice or a list of indices,
+        several time steps are stacked along a leading axis
+        '''
+        t, var, box = key[0], key[1], key[2:]
+        if isinstance(t, (int, np.integer)):
+            return self.read(t, var)[box] if box else self.read(t, var)
+        steps = range(len(self))[t] if isinstance(t, slice) else t
+        return np.stack([self.read(n, var)[box] if box else self.read(n, var) for n in steps])
+
+    def close(self):
+        '''
+        close the files of the readers, the cache is kept
+        '''
+        with self.lock:
+            for reader in self.readers:
+                if reader is not None:
+                    reader.close()
+            self.readers = [None]*len(self.paths)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return "PltDataset({:d} files, {})".format(len(self), self.cache)
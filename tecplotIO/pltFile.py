@@ -1,6 +1,53 @@
 # -*- coding:utf8 -*-
-import sys
+import io
+import os
 import struct
+from contextlib import nullcontext
+import numpy as np
+
+
+class _BufferFile(object):
+    """
+    read-only file object over a memoryview, read returns copies of the
+    requested bytes only, the buffer itself is never copied.
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.position = 0
+        self.closed = False
+
+    def read(self, size=-1):
+        end = len(self.buffer) if size < 0 else min(self.position + size, len(self.buffer))
+        data = self.buffer[self.position:end].tobytes()
+        self.position = max(end, self.position)
+        return data
+
+    def readinto(self, b):
+        data = self.buffer[self.position:self.position + len(b)]
+        b[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.position
+        elif whence == 2:
+            offset += len(self.buffer)
+        self.position = offset
+        return offset
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def fileno(self):
+        raise io.UnsupportedOperation("fileno")
+
+    def close(self):
+        self.closed = True
 
 
 class PltFile(object):
@@ -10,21 +57,94 @@ class PltFile(object):
         Mainly, converts bytes to char, long integers, float, double, text
     """
 
-    def __init__(self, filename, mode='rb'):
+    def __init__(self, source, mode='rb', stats=None, pool=None):
         """
         Arguments:
-            ** filename = str() # the name of the binary file.
+            ** source = str() # the name of the binary file, or
+                bytes, bytearray, memoryview, io.BytesIO or a binary file object.
+                Buffers are read in place, a file object is left open by close().
+            ** stats = PltStats() # optional I/O counters, None to disable
+            ** pool = HandlePool() # optional pool opening a file to read on demand,
+                None to keep the file open until close()
         """
-        self.filename = filename
-        try:
-            self.binaryfile = open(filename, mode=mode)
-        except IOError:
-            sys.exit("Error occured when opening the file.")
+        self.stats = stats
+        self.closed = False
+        self.pool = None
+        # position of the file while the pool keeps it closed
+        self.position = 0
+        # memoryview of the whole file when it is held in memory, None otherwise
+        self.buffer = None
+        self.ownsFile = True
+        if isinstance(source, (str, os.PathLike)):
+            self.filename = source
+            if pool is not None and mode == 'rb':
+                self.pool = pool
+                self.binaryfile = None
+                # opened once so that open() fails here as without a pool
+                with self._file():
+                    pass
+            else:
+                self.binaryfile = open(source, mode=mode)
+            return
+        self.filename = None
+        if 'r' in mode and not hasattr(source, 'read'):
+            self.buffer = memoryview(source).cast('B')
+        elif 'r' in mode and isinstance(source, io.BytesIO):
+            self.buffer = source.getbuffer()[source.tell():]
+        elif 'r' in mode and not source.seekable():
+            # e.g. a socket or a pipe, the plt format needs random access
+            self.buffer = memoryview(source.read())
+        else:
+            self.binaryfile = source
+            self.ownsFile = False
+            return
+        self.binaryfile = _BufferFile(self.buffer)
+
+    def _file(self):
+        """
+            context manager giving the open file, a file of a pool is
+            borrowed from it for the duration of one operation.
+        """
+        if self.pool is None:
+            return nullcontext(self.binaryfile)
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        return self.pool.borrow(self)
 
-    
     def close(self):
-        self.binaryfile.close()
+        if self.closed:
+            return
+        self.closed = True
+        if self.pool is not None:
+            self.pool.release(self)
+        elif self.ownsFile:
+            self.binaryfile.close()
 
+    def flush(self):
+        with self._file() as f:
+            f.flush()
+
+    def fileno(self):
+        with self._file() as f:
+            return f.fileno()
+
+    def tell(self):
+        with self._file() as f:
+            return f.tell()
+
+    def seek(self, offset):
+        if self.stats is not None:
+            self.stats.add(seeks=1)
+        with self._file() as f:
+            f.seek(offset)
+
+    def timer(self, phase):
+        """
+            context manager timing a phase in the stats, a no-op without stats.
+        """
+        if self.stats is None:
+            return nullcontext()
+        return self.stats.timer(phase)
 
     def _read_line(self, size=4):
         """
@@ -34,10 +154,17 @@ class PltFile(object):
             Parameters:
                 size = int() # the number of bytes
         """
-        return self.binaryfile.read(size)
+        with self._file() as f:
+            buffer = f.read(size)
+        if self.stats is not None:
+            self.stats.add(reads=1, bytesRead=len(buffer))
+        return buffer
 
     def _write_line(self, writtenBytes):
-        self.binaryfile.write(writtenBytes)
+        with self._file() as f:
+            f.write(writtenBytes)
+        if self.stats is not None:
+            self.stats.add(writes=1, bytesWritten=memoryview(writtenBytes).nbytes)
 
     def read_char(self, size=4):
         """
@@ -47,7 +174,7 @@ class PltFile(object):
         return self._read_line(size).decode("utf-8")
     
     def write_raw(self, rawBytes):
-        self.binaryfile.write(rawBytes)
+        self._write_line(rawBytes)
 
     def read_long_integer(self):
         """
@@ -57,7 +184,7 @@ class PltFile(object):
         return struct.unpack('l', self._read_line(4))[0]
 
     def write_long_integer(self, lIntNum):
-        self.binaryfile.write(struct.pack('l', lIntNum))
+        self._write_line(struct.pack('l', lIntNum))
 
     def read_integer(self):
         """
@@ -67,7 +194,7 @@ class PltFile(object):
         return struct.unpack('i', self._read_line(4))[0]
 
     def write_integer(self, intNum):
-        self.binaryfile.write(struct.pack('i', intNum))
+        self._write_line(struct.pack('i', intNum))
 
     def read_integer_list(self, num):
         """
@@ -78,7 +205,7 @@ class PltFile(object):
         return int_list
 
     def write_integer_list(self, intList):
-        self.binaryfile.write(struct.pack('{:d}i'.format(len(intList)), *intList))
+        self._write_line(struct.pack('{:d}i'.format(len(intList)), *intList))
 
     def read_float(self):
         """
@@ -88,7 +215,7 @@ class PltFile(object):
         return struct.unpack('f', self._read_line(4))[0]
     
     def write_float(self, floatNum):
-        self.binaryfile.write(struct.pack('f', floatNum))
+        self._write_line(struct.pack('f', floatNum))
 
     def read_float_list(self, num):
         """
@@ -99,7 +226,49 @@ class PltFile(object):
         return float_list
 
     def write_float_list(self, floatList):
-        self.binaryfile.write(struct.pack('{:d}f'.format(len(floatList)), *floatList))
+        self._write_line(struct.pack('{:d}f'.format(len(floatList)), *floatList))
+
+    def read_array(self, dtype, num, out=None):
+        """
+            This function reads num values of the given numpy dtype
+            directly into a new 1-d nd-array, no intermediate
+            python objects are created.
+            If out is given, the values are read into this contiguous
+            1-d nd-array instead.
+        """
+        dtype = np.dtype(dtype)
+        array = np.empty(num, dtype=dtype) if out is None else out
+        with self._file() as f:
+            nbytes = f.readinto(memoryview(array).cast('B'))
+        if self.stats is not None:
+            self.stats.add(reads=1, bytesRead=nbytes)
+        if nbytes != array.nbytes:
+            raise IOError("Unexpected end of file: {:d} of {:d} bytes read.".format(
+                nbytes, array.nbytes))
+        return array
+
+    def write_array(self, array, dtype):
+        """
+            This function writes the values of a nd-array as dtype
+            in Fortran order through the buffer protocol.
+        """
+        self._write_line(np.asarray(array, dtype=dtype).reshape(-1, order='F'))
+
+    def pwrite_array(self, array, dtype, offset):
+        """
+            This function writes the values of a nd-array as dtype
+            in Fortran order at offset by positional writes, the position
+            of the file is left as it is, so that threads may write at once.
+        """
+        data = memoryview(np.asarray(array, dtype=dtype).reshape(-1, order='F')).cast('B')
+        fd = self.fileno()
+        nbytes = data.nbytes
+        while data.nbytes > 0:
+            n = os.pwrite(fd, data, offset)
+            data = data[n:]
+            offset += n
+        if self.stats is not None:
+            self.stats.add(writes=1, bytesWritten=nbytes)
 
     def read_double(self):
         """
@@ -109,7 +278,7 @@ class PltFile(object):
         return struct.unpack('d', self._read_line(8))[0]
 
     def write_double(self, doubleNum):
-        self.binaryfile.write(struct.pack('d', doubleNum))
+        self._write_line(struct.pack('d', doubleNum))
 
     def read_double_list(self, num):
         """
@@ -120,22 +289,29 @@ class PltFile(object):
         return double_list
 
     def write_double_list(self, doubleList):
-        self.binaryfile.write(struct.pack('{:d}d'.format(len(doubleList)), *doubleList))
+        self._write_line(struct.pack('{:d}d'.format(len(doubleList)), *doubleList))
 
-    def read_string(self):
+    def read_string(self, chunk=64):
         """
             This method reads a string from a file.
-            The method continuously reads the file untile the null char
-            is read.
+            The method reads chunk characters at a time untile the null char
+            is found, then moves back to the end of the string.
             In tecplot data format, char are encoded as its ascii code.
         """
-        string = ""
+        codes = []
         while True:
-            ascii = self._read_line().decode('utf-8').replace(chr(0), "")
-            if ascii == "":
+            start = self.tell()
+            buffer = self._read_line(4*chunk)
+            chars = np.frombuffer(buffer, dtype='<i4', count=len(buffer)//4)
+            end = np.flatnonzero(chars == 0)
+            if end.size > 0:
+                codes.extend(chars[:end[0]].tolist())
+                self.seek(start + 4*(end[0]+1))
+                break
+            codes.extend(chars.tolist())
+            if len(chars) < chunk:
                 break
-            string += ascii
-        return string
+        return ''.join(map(chr, codes))
 
     def write_string(self, str):
         for c in str:
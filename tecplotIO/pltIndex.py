@@ -0,0 +1,55 @@
+# -*- coding:utf8 -*-
+import os
+import json
+
+# version of the sidecar index layout, an index of another version is rebuilt
+__INDEX_VERSION__ = 4
+
+
+def index_path(filename):
+    '''
+    path of the sidecar index of a plt file
+    '''
+    return filename + '.idx'
+
+
+def _file_key(filename):
+    stat = os.stat(filename)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def load_index(filename):
+    '''
+    load the sidecar index of a plt file,
+    None is returned if there is no index or it is out of date.
+    the index holds the head section of the file: variable names and, per zone,
+    extents, locations, formats, block offsets and min/max of the variables.
+    '''
+    try:
+        with open(index_path(filename), 'r') as f:
+            entry = json.load(f)
+        size, mtime = _file_key(filename)
+    except (OSError, ValueError):
+        return None
+    if (entry.get('indexVersion') != __INDEX_VERSION__
+            or entry.get('size') != size or entry.get('mtime') != mtime):
+        return None
+    return entry
+
+
+def save_index(filename, entry):
+    '''
+    write the sidecar index of a plt file, keyed by the size and mtime of the file.
+    the index is only a cache, failing to write it is not an error.
+    '''
+    size, mtime = _file_key(filename)
+    entry = dict(entry, indexVersion=__INDEX_VERSION__, size=size, mtime=mtime)
+    path = index_path(filename)
+    tmpPath = '{}.{:d}.tmp'.format(path, os.getpid())
+    try:
+        with open(tmpPath, 'w') as f:
+            json.dump(entry, f, separators=(',', ':'))
+        os.replace(tmpPath, path)
+    except OSError:
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
@@ -0,0 +1,87 @@
+# -*- coding:utf8 -*-
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class HandlePool(object):
+    '''bounded LRU pool of the open files of many readers.
+    a reader given the pool opens its file on demand, the least recently used
+    file is closed when more than maxOpen files are open and reopened at the same
+    position on its next access, so thousands of lazy readers hold at most maxOpen
+    descriptors. a file is borrowed for the duration of every read and is never
+    closed meanwhile, the cap is exceeded while more than maxOpen files are borrowed
+    at once by different threads.
+    attributes:
+        maxOpen :  int, cap of the open files
+        opens   :  int, number of files opened by the pool
+    '''
+
+    def __init__(self, maxOpen=128):
+        if maxOpen < 1:
+            raise ValueError("maxOpen should be at least 1, got {}".format(maxOpen))
+        self.maxOpen = maxOpen
+        self.opens = 0
+        # PltFile to [open file, number of borrows], least recently used first
+        self.handles = OrderedDict()
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def borrow(self, pltFile):
+        '''
+        open file of a PltFile, it is opened at its last position if it isn't open
+        '''
+        with self.lock:
+            entry = self.handles.get(pltFile)
+            if entry is None:
+                self.__evict(self.maxOpen-1)
+                handle = open(pltFile.filename, mode='rb')
+                handle.seek(pltFile.position)
+                self.opens += 1
+                entry = self.handles[pltFile] = [handle, 0]
+            else:
+                self.handles.move_to_end(pltFile)
+            entry[1] += 1
+        try:
+            yield entry[0]
+        finally:
+            with self.lock:
+                entry[1] -= 1
+                self.__evict(self.maxOpen)
+
+    def __evict(self, limit):
+        '''
+        close the least recently used files which aren't borrowed, down to limit open files
+        '''
+        for owner in list(self.handles):
+            if len(self.handles) <= limit:
+                break
+            handle, borrows = self.handles[owner]
+            if borrows == 0:
+                del self.handles[owner]
+                owner.position = handle.tell()
+                handle.close()
+
+    def release(self, pltFile):
+        '''
+        close the file of a PltFile if it is open
+        '''
+        with self.lock:
+            entry = self.handles.pop(pltFile, None)
+        if entry is not None:
+            pltFile.position = entry[0].tell()
+            entry[0].close()
+
+    def close(self):
+        '''
+        close every open file which isn't borrowed, the readers reopen them on their next access
+        '''
+        with self.lock:
+            self.__evict(0)
+
+    def __len__(self):
+        return len(self.handles)
+
+    def __repr__(self):
+        return "HandlePool({:d} of {:d} open, {:d} opens)".format(
+            len(self.handles), self.maxOpen, self.opens)
@@ -0,0 +1,146 @@
+# -*- coding:utf8 -*-
+import os
+import numpy as np
+from .tecplotIO import TecplotBinaryReader, TecplotBinaryWriter
+from .pltIndex import _file_key
+
+
+def lod_path(filename):
+    '''
+    path of the level-of-detail sidecar of a plt file
+    '''
+    return filename + '.lod.plt'
+
+
+def _lod_title(filename):
+    # the sidecar is tied to the size and mtime of the file it was built from
+    size, mtime = _file_key(filename)
+    return 'lod {:d} {:d}'.format(size, mtime)
+
+
+def _level_name(zoneName, level):
+    return '{}:lod{:d}'.format(zoneName, level)
+
+
+def _factors(z, level):
+    '''
+    decimation factor of every axis at a level, a flat axis is never decimated
+    '''
+    return tuple(2**level if n > 1 else 1 for n in (z.imax, z.jmax, z.kmax))
+
+
+def _level_shape(z, level):
+    '''
+    vertex shape of a level, its vertices are every 2**level-th vertex of the zone
+    '''
+    return tuple((n-1)//f + 1 for n, f in zip((z.imax, z.jmax, z.kmax), _factors(z, level)))
+
+
+def _coarsen(chunk, loc, factors, method):
+    '''
+    coarse values of a chunk of k-planes starting at a multiple of the k-factor.
+    vertex data is sampled at the coarse vertices, cell-centered data is averaged over,
+    or sampled at the first of, the fine cells of every coarse cell.
+    '''
+    fi, fj, fk = factors
+    if loc == 0:
+        return chunk[::fi, ::fj, ::fk]
+    ni, nj, nk = chunk.shape[0]//fi, chunk.shape[1]//fj, chunk.shape[2]//fk
+    if method == 'decimate':
+        return chunk[0:ni*fi:fi, 0:nj*fj:fj, 0:nk*fk:fk]
+    box = chunk[0:ni*fi, 0:nj*fj, 0:nk*fk].reshape((ni, fi, nj, fj, nk, fk))
+    return box.mean(axis=(1, 3, 5), dtype=np.float64)
+
+
+def build_pyramid(filename, variables=None, levels=3, method='average', chunkBytes=1 << 26):
+    '''
+    build the level-of-detail sidecar of a plt file in one streaming pass over its blocks.
+    level L of a zone keeps every 2**L-th vertex along every axis which is not flat, it is
+    stored as the zone '<zone name>:lod<L>' of the sidecar, a plt file itself.
+    parameters:
+        filename  :  string, the plt file
+        variables :  list of names or indices of the variables of the pyramid, default is all,
+                     the others are passive in the sidecar
+        levels    :  int, number of coarse levels, 2x, 4x, ... 2**levels x
+        method    :  'average' or 'decimate', coarsening of cell-centered data, vertex data,
+                     e.g. the grid, is always sampled at the coarse vertices
+        chunkBytes : int, size of the chunks of k-planes read at once
+    return:
+        path of the sidecar
+    '''
+    if method not in ('average', 'decimate'):
+        raise ValueError("method should be 'average' or 'decimate', got {}".format(method))
+    with TecplotBinaryReader(filename, lazy=True) as reader:
+        names = reader.variablesName
+        if variables is None:
+            variables = list(range(len(names)))
+        variables = [names.index(v) if isinstance(v, str) else v for v in variables]
+        zones = []
+        for z in reader.zone:
+            if any(n > 1 and (n-1)//f < 1 for n, f in zip((z.imax, z.jmax, z.kmax), _factors(z, levels))):
+                raise ValueError("zone {} of shape {} is too small for {:d} levels".format(
+                    z.name, (z.imax, z.jmax, z.kmax), levels))
+            for level in range(1, levels+1):
+                zones.append({
+                    'shape': _level_shape(z, level),
+                    'varsLoc': list(z.variablesLocation),
+                    'dataFormat': list(z.variablesDtype),
+                    'name': _level_name(z.name, level),
+                    'strandId': z.strand_id,
+                    'solutionTime': z.solutiontime,
+                    'passiveVars': [v for v in range(len(names)) if v not in variables],
+                })
+
+        path = lod_path(filename)
+        tmpPath = '{}.{:d}.tmp'.format(path, os.getpid())
+        try:
+            with TecplotBinaryWriter(tmpPath, varsName=names, title=_lod_title(filename),
+                                     zones=zones) as writer:
+                for n, z in enumerate(reader.zone):
+                    # chunks of k-planes start at multiples of the coarsest k-factor
+                    fk = _factors(z, levels)[2]
+                    planeBytes = z.imax*z.jmax*max(d.itemsize for d in z.variablesDtype)
+                    nkChunk = max(fk, chunkBytes//planeBytes//fk*fk)
+                    for var in variables:
+                        nk = z.variable_shape(var)[2]
+                        for k0 in range(0, nk, nkChunk):
+                            chunk = z.read_slab(var, k=slice(k0, min(k0+nkChunk, nk)))
+                            for level in range(1, levels+1):
+                                factors = _factors(z, level)
+                                coarse = _coarsen(chunk, z.variablesLocation[var], factors, method)
+                                if coarse.size > 0:
+                                    writer.write_slab(var, k0//factors[2], coarse,
+                                                      zone=n*levels + level-1)
+            os.replace(tmpPath, path)
+        finally:
+            if os.path.exists(tmpPath):
+                os.remove(tmpPath)
+    return path
+
+
+def read_lod(filename, var, target, zone=0):
+    '''
+    a variable, given by name or index, at the coarsest level whose vertex shape is at
+    least target in every axis, e.g. target=(256, 256, 128).
+    the full resolution variable is read if no level meets the target or if the sidecar
+    is missing or out of date.
+    return:
+        array, level   (level 0 is the full resolution)
+    '''
+    with TecplotBinaryReader(filename, lazy=True) as reader:
+        z = reader.get_zone(zone)
+        name = z.name
+        target = tuple(target)
+        path = lod_path(filename)
+        if os.path.exists(path):
+            with TecplotBinaryReader(path, lazy=True) as lod:
+                if lod.title == _lod_title(filename):
+                    levels = [n for n in lod.get_zone_names() if n.startswith(name + ':lod')]
+                    for level in sorted((int(n.rsplit(':lod', 1)[1]) for n in levels), reverse=True):
+                        lz = lod.get_zone(_level_name(name, level))
+                        varIdx = lod.variablesName.index(var) if isinstance(var, str) else var
+                        if not lz.passiveVariables[varIdx] and all(
+                                n >= t for n, t in zip((lz.imax, lz.jmax, lz.kmax), target)):
+                            return lz[varIdx], level
+        varIdx = reader.variablesName.index(var) if isinstance(var, str) else var
+        return z[varIdx], 0
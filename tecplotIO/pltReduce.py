@@ -0,0 +1,182 @@
+# -*- coding:utf8 -*-
+import numpy as np
+
+# statistics computed by the reductions
+__REDUCE_OPS__ = ('sum', 'mean', 'rms', 'std', 'min', 'max', 'hist', 'ksum')
+# statistics of every point over time
+__POINTWISE_OPS__ = ('sum', 'mean', 'rms', 'std', 'min', 'max')
+
+# default size of the chunks of k-planes streamed through the accumulators
+__REDUCE_CHUNK_BYTES__ = 1 << 26
+
+
+def _check_ops(ops, valid):
+    for op in ops:
+        if op not in valid:
+            raise ValueError("unsupported reduction {}, valid ones are {}".format(op, ', '.join(valid)))
+
+
+class Reduction(object):
+    '''statistics of all the values of a variable, accumulated chunk by chunk,
+    possibly over several zones or files.
+    parameters:
+        ops   :  list of 'sum', 'mean', 'rms', 'std', 'min', 'max', 'hist' and 'ksum',
+                 the sum over every k-plane
+        bins  :  int, number of bins of the histogram
+        range :  (lo, hi) of the histogram, values out of it are not counted,
+                 an empty range is widened to (lo-0.5, hi+0.5)
+    '''
+
+    def __init__(self, ops, bins=64, range=None):
+        _check_ops(ops, __REDUCE_OPS__)
+        if 'hist' in ops and range is None:
+            raise ValueError("the range of the histogram is required")
+        self.ops = list(ops)
+        self.count = 0
+        self.total = 0.0
+        self.squares = 0.0
+        # mean and sum of squared deviations, merged chunk by chunk for the std
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        if 'hist' in ops and range[0] == range[1]:
+            # e.g. the min/max range of a constant field, widened as np.histogram does
+            range = (range[0]-0.5, range[1]+0.5)
+        self.edges = np.linspace(range[0], range[1], bins+1) if 'hist' in ops else None
+        self.hist = np.zeros(bins, dtype=np.int64) if 'hist' in ops else None
+        self.ksum = np.zeros(0)
+
+    def update(self, chunk, k0=0):
+        '''
+        accumulate a chunk of values, chunk is (ni, nj, nk) starting at k-plane k0
+        '''
+        if chunk.size == 0:
+            return
+        ops = self.ops
+        n = chunk.size
+        if 'sum' in ops or 'mean' in ops:
+            self.total += float(chunk.sum(dtype=np.float64))
+        if 'rms' in ops:
+            self.squares += float(np.square(chunk, dtype=np.float64).sum())
+        if 'std' in ops:
+            mean = float(chunk.mean(dtype=np.float64))
+            m2 = float(np.square(chunk - mean, dtype=np.float64).sum())
+            delta = mean - self.mean
+            self.mean += delta*n/(self.count+n)
+            self.m2 += m2 + delta*delta*self.count*n/(self.count+n)
+        if 'min' in ops:
+            self.min = min(self.min, float(chunk.min()))
+        if 'max' in ops:
+            self.max = max(self.max, float(chunk.max()))
+        if 'hist' in ops:
+            self.hist += np.histogram(chunk, bins=self.edges)[0]
+        if 'ksum' in ops:
+            k1 = k0 + chunk.shape[2]
+            if k1 > len(self.ksum):
+                self.ksum = np.concatenate([self.ksum, np.zeros(k1-len(self.ksum))])
+            self.ksum[k0:k1] += chunk.sum(axis=(0, 1), dtype=np.float64)
+        self.count += n
+
+    def result(self):
+        '''
+        dict of statistic name to value, 'hist' is (counts, bin edges) and 'ksum' a 1-d array
+        '''
+        count = max(self.count, 1)
+        values = {'count': self.count}
+        for op in self.ops:
+            if op == 'sum':
+                values[op] = self.total
+            elif op == 'mean':
+                values[op] = self.total/count
+            elif op == 'rms':
+                values[op] = np.sqrt(self.squares/count)
+            elif op == 'std':
+                values[op] = np.sqrt(self.m2/count)
+            elif op == 'min':
+                values[op] = self.min
+            elif op == 'max':
+                values[op] = self.max
+            elif op == 'hist':
+                values[op] = (self.hist.copy(), self.edges.copy())
+            elif op == 'ksum':
+                values[op] = self.ksum.copy()
+        return values
+
+
+class PointwiseReduction(object):
+    '''statistics of every point of a variable over several snapshots, accumulated
+    chunk by chunk, only the accumulators are of the size of the variable.
+    parameters:
+        ops   :  list of 'sum', 'mean', 'rms', 'std', 'min', 'max'
+        shape :  shape of the variable
+    '''
+
+    def __init__(self, ops, shape):
+        _check_ops(ops, __POINTWISE_OPS__)
+        self.ops = list(ops)
+        self.shape = tuple(shape)
+        self.steps = 0
+        needSum = any(op in ops for op in ('sum', 'mean'))
+        self.total = np.zeros(self.shape, order='F') if needSum else None
+        self.squares = np.zeros(self.shape, order='F') if 'rms' in ops else None
+        # running mean and sum of squared deviations of every point (Welford) for the std
+        self.mean = np.zeros(self.shape, order='F') if 'std' in ops else None
+        self.m2 = np.zeros(self.shape, order='F') if 'std' in ops else None
+        self.min = np.full(self.shape, np.inf, order='F') if 'min' in ops else None
+        self.max = np.full(self.shape, -np.inf, order='F') if 'max' in ops else None
+
+    def update(self, chunk, k0=0):
+        '''
+        accumulate the k-planes [k0, k0+nk) of a snapshot, chunk is (ni, nj, nk).
+        steps is incremented once every k-plane of the snapshot is accumulated.
+        '''
+        k = slice(k0, k0+chunk.shape[2])
+        if self.total is not None:
+            self.total[:, :, k] += chunk
+        if self.squares is not None:
+            self.squares[:, :, k] += np.square(chunk, dtype=np.float64)
+        if self.mean is not None:
+            mean = self.mean[:, :, k]
+            delta = chunk - mean
+            mean += delta/(self.steps+1)
+            self.m2[:, :, k] += delta*(chunk - mean)
+        if self.min is not None:
+            np.minimum(self.min[:, :, k], chunk, out=self.min[:, :, k])
+        if self.max is not None:
+            np.maximum(self.max[:, :, k], chunk, out=self.max[:, :, k])
+
+    def result(self):
+        '''
+        dict of statistic name to array of the shape of the variable
+        '''
+        steps = max(self.steps, 1)
+        values = {'count': self.steps}
+        for op in self.ops:
+            if op == 'sum':
+                values[op] = self.total
+            elif op == 'mean':
+                values[op] = self.total/steps
+            elif op == 'rms':
+                values[op] = np.sqrt(self.squares/steps)
+            elif op == 'std':
+                values[op] = np.sqrt(self.m2/steps)
+            elif op == 'min':
+                values[op] = self.min
+            elif op == 'max':
+                values[op] = self.max
+        return values
+
+
+def reduce_zone(z, varIdx, accumulator, chunkBytes=__REDUCE_CHUNK_BYTES__):
+    '''
+    stream variable varIdx of a zone through an accumulator in chunks of k-planes of
+    about chunkBytes, the ghost cells of cell-centered data are never accumulated.
+    '''
+    ni, nj, nk = z.variable_shape(varIdx)
+    _, blockShape = z._block_layout(varIdx)
+    planeBytes = blockShape[0]*blockShape[1]*z.variablesDtype[varIdx].itemsize
+    nkChunk = max(1, min(nk, chunkBytes//planeBytes))
+    for k0 in range(0, nk, nkChunk):
+        accumulator.update(z.read_slab(varIdx, k=slice(k0, min(k0+nkChunk, nk))), k0)
+    return accumulator
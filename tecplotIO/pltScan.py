@@ -0,0 +1,58 @@
+# -*- coding:utf8 -*-
+from .tecplotIO import TecplotBinaryReader
+
+
+class ZoneSummary(object):
+    '''header-only summary of a zone of a plt file.
+    attributes:
+        path     :  string, the plt file
+        zone     :  int, index of the zone in the file
+        name     :  string, zone name
+        shape    :  (imax, jmax, kmax) of the zone
+        solutiontime, strand_id : zone header entries
+        names    :  list of string, variable names
+        location :  dict of variable name to data location, 0: vertex; 1: cell-centered
+        format   :  dict of variable name to numpy dtype
+        min, max :  dict of variable name to the min/max recorded in the file
+    '''
+
+    def __init__(self, path, zoneIdx, names, z):
+        self.path = path
+        self.zone = zoneIdx
+        self.name = z.name
+        self.shape = (z.imax, z.jmax, z.kmax)
+        self.solutiontime = z.solutiontime
+        self.strand_id = z.strand_id
+        self.names = list(names)
+        self.location = dict(zip(names, z.variablesLocation))
+        self.format = dict(zip(names, z.variablesDtype))
+        self.min = dict(zip(names, z.min_value))
+        self.max = dict(zip(names, z.max_value))
+
+    def __repr__(self):
+        return "ZoneSummary({}, zone {:d}, shape {}, solution time {})".format(
+            self.path, self.zone, self.shape, self.solutiontime)
+
+
+def scan(path, index=False):
+    '''
+    summaries of every zone of a plt file, only the head section and
+    the preamble of the data section are read, no data is decoded.
+    index is passed to TecplotBinaryReader to use the sidecar index.
+    '''
+    reader = TecplotBinaryReader(path, lazy=True, index=index)
+    reader.close()
+    return [ZoneSummary(path, n, reader.variablesName, z) for n, z in enumerate(reader.zone)]
+
+
+def select(paths, where, index=False):
+    '''
+    summaries of the zones of the plt files for which where(summary) is true,
+    e.g. select(paths, where=lambda s: s.max['T'] > 1500).
+    the predicate only sees the header, files and zones whose min/max can't match
+    are skipped without reading their data.
+    '''
+    selected = []
+    for path in paths:
+        selected.extend(s for s in scan(path, index=index) if where(s))
+    return selected
@@ -0,0 +1,181 @@
+# -*- coding:utf8 -*-
+import weakref
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+from .tecplotIO import TecplotBinaryReader, field_array
+from .pltShared import _attach_shared
+from .pltReduce import Reduction, PointwiseReduction, reduce_zone
+
+
+def _series_array(nt, shape, dtype, buffer=None):
+    '''
+    (t, i, j, k) array whose every time step is an F-contiguous (i, j, k) block,
+    so a variable block of the plt file can be read straight into it.
+    '''
+    return field_array((nt,), shape, dtype, buffer)
+
+
+def _read_header(path, sortBy):
+    '''
+    sort key, variable names, and shape and dtype of every variable of a plt file
+    '''
+    reader = TecplotBinaryReader(path, lazy=True)
+    z = reader.zone[0]
+    key = z.solutiontime if sortBy == 'solutiontime' else z.strand_id
+    layout = [(z.variable_shape(i), z.variablesDtype[i].str)
+              for i in range(reader.numVariables)]
+    reader.close()
+    return key, reader.variablesName, layout
+
+
+def _fill(path, variables, outs):
+    '''
+    read the variables of a plt file into the given (i, j, k) arrays
+    '''
+    reader = TecplotBinaryReader(path, lazy=True)
+    for name, out in zip(variables, outs):
+        varIdx = reader.variablesName.index(name)
+        reader.zone[0].read_variable(varIdx, reader.pltFile, out=out)
+    reader.close()
+
+
+def _fill_shared(path, variables, specs, t):
+    '''
+    read the variables of a plt file into time step t of shared memory blocks,
+    specs holds the (block name, nt, shape, dtype) of every variable.
+    '''
+    blocks = [_attach_shared(spec[0]) for spec in specs]
+    try:
+        outs = [_series_array(nt, shape, dtype, block.buf)[t]
+                for block, (_, nt, shape, dtype) in zip(blocks, specs)]
+        _fill(path, variables, outs)
+        del outs
+    finally:
+        for block in blocks:
+            block.close()
+
+
+def read_series(paths, variables=None, workers=None, backend='thread', sortBy='solutiontime'):
+    '''
+    read the variables of a time series of single-zone plt files concurrently.
+    parameters:
+        paths     :  list of string, plt files of the series
+        variables :  list of string, names of the variables to read, default is all
+        workers   :  int, number of workers, default is decided by concurrent.futures
+        backend   :  'thread' or 'process'
+        sortBy    :  'solutiontime' or 'strand_id', zone header entry the files are sorted by
+    return:
+        keys   :  1-d array of the sorted solution times or strand ids
+        fields :  dict of variable name to (t, i, j, k) array, those of the process backend
+                  view the shared memory blocks filled by the workers
+    '''
+    if backend == 'thread':
+        Executor = ThreadPoolExecutor
+    elif backend == 'process':
+        Executor = ProcessPoolExecutor
+        # started before the workers so that they inherit it
+        resource_tracker.ensure_running()
+    else:
+        raise ValueError("backend should be 'thread' or 'process', got {}".format(backend))
+    if sortBy not in ('solutiontime', 'strand_id'):
+        raise ValueError("sortBy should be 'solutiontime' or 'strand_id', got {}".format(sortBy))
+
+    with Executor(max_workers=workers) as pool:
+        headers = list(pool.map(_read_header, paths, [sortBy]*len(paths)))
+        order = sorted(range(len(paths)), key=lambda n: headers[n][0])
+        paths = [paths[n] for n in order]
+        headers = [headers[n] for n in order]
+        keys = np.array([h[0] for h in headers])
+
+        names = headers[0][1]
+        if variables is None:
+            variables = list(names)
+        layouts = []
+        for name in variables:
+            layout = headers[0][2][names.index(name)]
+            for path, h in zip(paths, headers):
+                if name not in h[1] or h[2][h[1].index(name)][0] != layout[0]:
+                    raise ValueError(
+                        "variable {} of {} does not match the series".format(name, path))
+            dtype = np.result_type(*[h[2][h[1].index(name)][1] for h in headers])
+            layouts.append((layout[0], dtype))
+
+        nt = len(paths)
+        if backend == 'thread':
+            fields = [_series_array(nt, shape, dtype) for shape, dtype in layouts]
+            futures = [pool.submit(_fill, path, variables, [out[t] for out in fields])
+                       for t, path in enumerate(paths)]
+            for future in futures:
+                future.result()
+        else:
+            # the workers fill shared memory blocks in place, no data is pickled
+            blocks = [shared_memory.SharedMemory(
+                create=True, size=max(1, nt*int(np.prod(shape))*dtype.itemsize))
+                for shape, dtype in layouts]
+            try:
+                specs = [(block.name, nt, shape, dtype.str)
+                         for block, (shape, dtype) in zip(blocks, layouts)]
+                futures = [pool.submit(_fill_shared, path, variables, specs, t)
+                           for t, path in enumerate(paths)]
+                for future in futures:
+                    future.result()
+            except BaseException:
+                for block in blocks:
+                    block.close()
+                    block.unlink()
+                raise
+            # the fields are the blocks themselves, their names are freed at once and
+            # a block is unmapped once no array views it anymore
+            fields = []
+            for block, (shape, dtype) in zip(blocks, layouts):
+                block.unlink()
+                field = _series_array(nt, shape, dtype, block.buf)
+                weakref.finalize(field.base, block.close)
+                fields.append(field)
+
+    return keys, dict(zip(variables, fields))
+
+
+def reduce_series(paths, var, ops=('mean',), pointwise=False, chunkBytes=1 << 26, bins=64, range=None,
+                  zone=0, index=False):
+    '''
+    statistics of a variable over the zones of a series of plt files, the files are
+    streamed one chunk of k-planes at a time.
+    parameters:
+        paths     :  list of string, plt files of the series
+        var       :  string or int, the variable
+        ops       :  list of 'sum', 'mean', 'rms', 'std', 'min', 'max', and unless pointwise,
+                     'hist' and 'ksum', see Reduction
+        pointwise :  bool, statistics of every point over time, e.g. the time-averaged field,
+                     instead of the statistics of all the values
+        chunkBytes : int, size of the chunks of k-planes
+        bins, range : histogram, the default range spans the min/max in the files
+        zone      :  int or string, zone of every file
+        index     :  bool, use the sidecar index of the files
+    return:
+        dict of statistic name to value, see Reduction.result and PointwiseReduction.result
+    '''
+    if 'hist' in ops and range is None:
+        summaries = []
+        for path in paths:
+            with TecplotBinaryReader(path, lazy=True, index=index) as reader:
+                z = reader.get_zone(zone)
+                varIdx = reader.variablesName.index(var) if isinstance(var, str) else var
+                summaries.append((z.min_value[varIdx], z.max_value[varIdx]))
+        range = (min(s[0] for s in summaries), max(s[1] for s in summaries))
+    accumulator = None
+    for path in paths:
+        with TecplotBinaryReader(path, lazy=True, index=index) as reader:
+            z = reader.get_zone(zone)
+            varIdx = reader.variablesName.index(var) if isinstance(var, str) else var
+            if accumulator is None and pointwise:
+                accumulator = PointwiseReduction(ops, z.variable_shape(varIdx))
+            elif accumulator is None:
+                accumulator = Reduction(ops, bins, range)
+            elif pointwise and accumulator.shape != z.variable_shape(varIdx):
+                raise ValueError("variable {} of {} does not match the series".format(var, path))
+            reduce_zone(z, varIdx, accumulator, chunkBytes)
+            if pointwise:
+                accumulator.steps += 1
+    return accumulator.result()
@@ -0,0 +1,93 @@
+# -*- coding:utf8 -*-
+from multiprocessing import shared_memory
+import numpy as np
+
+
+def _attach_shared(name):
+    '''
+    attach an existing shared memory block, its lifetime is left to the creating process
+    '''
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # python < 3.13 registers every attached block, this is harmless as long as
+        # the worker shares the resource tracker of the creating process
+        return shared_memory.SharedMemory(name=name)
+
+
+class SharedField(object):
+    '''picklable handle of a field stored in a shared memory block.
+    only the name of the block, the shape and the dtype are pickled, a worker process
+    attaches the block and gets the field as an F-ordered nd-array without any copy.
+    attributes:
+        name  :  string, name of the shared memory block
+        shape :  tuple, shape of the field
+        dtype :  string, numpy dtype of the field
+    lifecycle: every process calls close() once it has dropped the arrays of attach(),
+    the creating process calls unlink() once the consumers are done, which frees the
+    block. used as a context manager, the field is closed, and unlinked in the
+    creating process, at exit.
+    '''
+
+    def __init__(self, name, shape, dtype):
+        self.name = name
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype).str
+        # the block once attached, and whether this process created it
+        self.block = None
+        self.owner = False
+
+    @classmethod
+    def create(cls, shape, dtype):
+        '''
+        a field in a new shared memory block, owned by this process
+        '''
+        size = int(np.prod(shape))*np.dtype(dtype).itemsize
+        block = shared_memory.SharedMemory(create=True, size=max(1, size))
+        field = cls(block.name, shape, dtype)
+        field.block = block
+        field.owner = True
+        return field
+
+    def __getstate__(self):
+        return {'name': self.name, 'shape': self.shape, 'dtype': self.dtype}
+
+    def __setstate__(self, state):
+        self.__init__(state['name'], state['shape'], state['dtype'])
+
+    def attach(self):
+        '''
+        the field as an F-ordered nd-array viewing the shared block
+        '''
+        if self.block is None:
+            self.block = _attach_shared(self.name)
+        return np.ndarray(self.shape, dtype=self.dtype, buffer=self.block.buf, order='F')
+
+    def close(self):
+        '''
+        detach the block from this process, the arrays of attach() must be dropped before
+        '''
+        if self.block is not None:
+            self.block.close()
+            self.block = None
+
+    def unlink(self):
+        '''
+        free the block, the field can't be attached anymore
+        '''
+        block = self.block if self.block is not None else _attach_shared(self.name)
+        block.unlink()
+        if self.block is None:
+            block.close()
+        self.owner = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.owner:
+            self.unlink()
+        self.close()
+
+    def __repr__(self):
+        return "SharedField({}, shape {}, dtype {})".format(self.name, self.shape, self.dtype)
@@ -0,0 +1,78 @@
+# -*- coding:utf8 -*-
+import time
+import threading
+from contextlib import contextmanager
+
+
+class PltStats(object):
+    '''opt-in I/O counters and phase timers of a reader or writer.
+    attributes:
+        bytesRead, bytesWritten :  int, bytes transferred from/to the file
+        reads, writes, seeks    :  int, number of calls to the file object. small reads
+                                   and writes are buffered, so they are an upper bound
+                                   of the system calls
+        seconds  :  dict of phase name to accumulated seconds
+        calls    :  dict of phase name to number of timed calls
+    the phases are:
+        reader : 'file_info', 'zone_vars', 'data_preamble', 'decode', 'reshape'
+        writer : 'head', 'minmax', 'write', 'close'
+    callbacks : list of callable(phase, seconds, stats), called after every timed phase,
+                e.g. to forward the timings to a metrics system
+    the counters may be updated from several threads, e.g. by a writer with workers.
+    '''
+
+    def __init__(self, callbacks=None):
+        self.callbacks = list(callbacks) if callbacks is not None else []
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.bytesRead = 0
+            self.bytesWritten = 0
+            self.reads = 0
+            self.writes = 0
+            self.seeks = 0
+            self.seconds = {}
+            self.calls = {}
+
+    def add(self, **counters):
+        '''
+        increment counters, e.g. add(reads=1, bytesRead=n)
+        '''
+        with self.lock:
+            for name, value in counters.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    @contextmanager
+    def timer(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            with self.lock:
+                self.seconds[phase] = self.seconds.get(phase, 0.0) + seconds
+                self.calls[phase] = self.calls.get(phase, 0) + 1
+            for callback in self.callbacks:
+                callback(phase, seconds, self)
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                'bytesRead': self.bytesRead,
+                'bytesWritten': self.bytesWritten,
+                'reads': self.reads,
+                'writes': self.writes,
+                'seeks': self.seeks,
+                'seconds': dict(self.seconds),
+                'calls': dict(self.calls),
+            }
+
+    def __repr__(self):
+        line = "I/O: {:d} bytes read in {:d} reads, {:d} bytes written in {:d} writes, {:d} seeks \n".format(
+            self.bytesRead, self.reads, self.bytesWritten, self.writes, self.seeks)
+        for phase in self.seconds:
+            line += "    {:14s}: {:.6f} s in {:d} calls \n".format(
+                phase, self.seconds[phase], self.calls[phase])
+        return line
@@ -1,7 +1,13 @@
 # -*- coding:utf8 -*-
+import os
 import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from .pltFile import PltFile
+from .pltIndex import load_index, save_index
+from .pltShared import SharedField
+from .pltReduce import Reduction, reduce_zone
 
 __ZONE__ = 299.0
 __EOH__ = 357.0
@@ -19,11 +25,143 @@ __FEPOLYHEDRON__ = 7
 
 __NO_SHARE_CONNECTIVITY__ = -1
 
+__BLOCK__ = 0
+__POINT__ = 1
+
+# the zone header carries the data packing in version 111, 112 is always BLOCK
+__TEC_VERSIONS__ = (111, 112)
+__TEC_POINT_VERSION__ = 111
+
+# size of the buffer of k-planes used to pad or reorder written data
+__WRITE_CHUNK_BYTES__ = 1 << 24
+
 __TEC_FLOAT__ = 1
 __TEC_DOUBLE__ = 2
 __TEC_LONG_INT__ = 3
 __TEC_INT__ = 4
 
+# numpy dtype of each tecplot data format, plt files are little-endian
+__TEC_DTYPES__ = {
+    __TEC_FLOAT__: np.dtype('<f4'),
+    __TEC_DOUBLE__: np.dtype('<f8'),
+    __TEC_LONG_INT__: np.dtype('<i8'),
+    __TEC_INT__: np.dtype('<i4'),
+}
+
+# tecplot data format of the format characters accepted by the writer
+__TEC_FORMAT_CHARS__ = {
+    'f': __TEC_FLOAT__,
+    'd': __TEC_DOUBLE__,
+    'l': __TEC_LONG_INT__,
+    'i': __TEC_INT__,
+}
+
+
+def _format_code(fmt, var=None):
+    '''
+    tecplot data format of a format character ('f', 'd', 'i', 'l'), a numpy dtype,
+    or 'auto' to infer it from the dtype of var
+    '''
+    if isinstance(fmt, str) and fmt in __TEC_FORMAT_CHARS__:
+        return __TEC_FORMAT_CHARS__[fmt]
+    if isinstance(fmt, str) and fmt == 'auto':
+        if var is None:
+            raise ValueError("format 'auto' needs the variable to infer its dtype")
+        fmt = np.asarray(var).dtype
+    dtype = np.dtype(fmt)
+    if np.issubdtype(dtype, np.floating):
+        return __TEC_FLOAT__ if dtype.itemsize <= 4 else __TEC_DOUBLE__
+    if np.issubdtype(dtype, np.integer) or dtype == np.bool_:
+        # int32 holds the values of every smaller integer type
+        if dtype.itemsize < 4 or (dtype.itemsize == 4 and np.issubdtype(dtype, np.signedinteger)):
+            return __TEC_INT__
+        return __TEC_LONG_INT__
+    raise ValueError("data format not supported: {}".format(fmt))
+
+
+def _stored_bounds(array, dtype):
+    '''
+    min and max of an array as stored in dtype. a cast never reorders values,
+    so the two bounds are cast instead of the whole array.
+    '''
+    bounds = np.array([array.min(), array.max()]).astype(dtype)
+    return float(bounds[0]), float(bounds[1])
+
+
+def _local_slice(idx, lo):
+    '''
+    slice selecting the indices of range idx from an array starting at index lo
+    '''
+    stop = idx.stop - lo
+    return slice(idx.start - lo, stop if stop >= 0 else None, idx.step)
+
+
+def field_array(lead, shape, dtype, buffer=None):
+    '''
+    array of shape lead + shape, e.g. (nvar, i, j, k), whose every (i, j, k) field
+    is F-contiguous like the variables read from a plt file.
+    '''
+    ni, nj, nk = shape
+    axes = tuple(range(len(lead))) + tuple(range(len(lead)+2, len(lead)-1, -1))
+    return np.ndarray(tuple(lead) + (nk, nj, ni), dtype=dtype, buffer=buffer).transpose(axes)
+
+
+def _center_dtype(dtype):
+    # averages of integer data are float64
+    return dtype if np.issubdtype(dtype, np.floating) else np.float64
+
+
+def _corners(shape):
+    '''
+    number of cells along the last three axes of a vertex array of this shape,
+    and the slices of the vertices at the corners of every cell
+    '''
+    cells = tuple(max(n-1, 1) for n in shape[-3:])
+    offsets = [(0, 1) if n > 1 else (0,) for n in shape[-3:]]
+    slices = [(Ellipsis, slice(a, a+cells[0]), slice(b, b+cells[1]), slice(c, c+cells[2]))
+              for a in offsets[0] for b in offsets[1] for c in offsets[2]]
+    return cells, slices
+
+
+def average_to_center(var, out=None):
+    '''
+    average vertex data to cell centers along the last three axes (i, j, k).
+    var is a (i, j, k) array or a stack of them, e.g. (nvar, i, j, k).
+    the corners are accumulated in place in out, no temporary array is created.
+    '''
+    var = np.asarray(var)
+    cells, slices = _corners(var.shape)
+    if out is None:
+        out = field_array(var.shape[:-3], cells, _center_dtype(var.dtype))
+    np.copyto(out, var[slices[0]])
+    for sl in slices[1:]:
+        np.add(out, var[sl], out=out)
+    out *= 1.0/len(slices)
+    return out
+
+
+def average_to_vertex(var, shape, out=None):
+    '''
+    average cell-centered data to vertices along the last three axes (i, j, k),
+    the inverse of average_to_center. shape is the (imax, jmax, kmax) of the vertices,
+    every vertex is the mean of the cells around it.
+    '''
+    var = np.asarray(var)
+    shape = tuple(shape)
+    _, slices = _corners(shape)
+    if out is None:
+        out = field_array(var.shape[:-3], shape, _center_dtype(var.dtype))
+    out[...] = 0
+    for sl in slices:
+        np.add(out[sl], var, out=out[sl])
+    # number of cells around every vertex, separable along i, j, k
+    for axis, n in enumerate(shape):
+        if n > 1:
+            count = np.full(n, 2.0)
+            count[0] = count[-1] = 1.0
+            out /= count.reshape((n,) + (1,)*(2-axis))
+    return out
+
 
 class Zone(object):
     def __init__(self, numOfVariables):
@@ -45,6 +183,23 @@ class Zone(object):
         self.min_value = []
         self.max_value = []
         self.data = []  # double list each element is the data the viariable
+        # byte offset and numpy dtype of every variable block
+        self.variablesOffset = []
+        self.variablesDtype = []
+        # file of the lazily loaded variables
+        self.pltFile = None
+        # file name to memory-map the variables from, or memoryview of the file
+        # to take them as views of, None if not mapped
+        self.mapSource = None
+        # offset of the min/max values in the data section
+        self.minmaxOffset = int()
+        # offset of the first variable block
+        self.dataOffset = int()
+        # 1 for a passive variable, which has no values in the file
+        self.passiveVariables = []
+        # zone a variable is shared with, -1 if not shared, and the Zone it refers to
+        self.sharingVariables = []
+        self.sharedZones = []
         # ------------------------------------------------------------------------
         # Zone Type:
         # 0 = ORDERED       1 = FELINESEG 2 = FETRIANGLE 3 = FEQUADRILATERAL
@@ -57,6 +212,10 @@ class Zone(object):
         # 1 = POINT
         # ------------------------------------------------
         self.datapacking = int()
+        # structured dtype of a point of a POINT zone, one field per stored variable,
+        # and the points once they are read
+        self.pointDtype = None
+        self.points = None
 
         # ------------------------------------------------
         # Zones
@@ -79,17 +238,19 @@ class Zone(object):
         self.jCell = int()
         self.kCell = int()
 
-    def _read_zone_vars(self, pltFile):
+    def _read_zone_vars(self, pltFile, version=112):
         self.name = pltFile.read_string()
         self.parentzone = pltFile.read_integer()
         self.strand_id = pltFile.read_integer()
         self.solutiontime = pltFile.read_double()
         self.not_used = pltFile.read_integer()
         self.type = pltFile.read_integer()
+        if version < 112:
+            self.datapacking = pltFile.read_integer()
 
         var_location = pltFile.read_integer()
         if var_location == 0:
-            self.variablesLocation = [0*self.numOfVariables]
+            self.variablesLocation = [0]*self.numOfVariables
         else:
             self.variablesLocation = pltFile.read_integer_list(
                 self.numOfVariables)
@@ -108,13 +269,16 @@ class Zone(object):
                 or self.type == __FETETRAHEDRON__   \
                 or self.type == __FEPOLYGON__       \
                 or self.type == __FEPOLYHEDRON__:
-            sys.exit('only ordered data format is supported!')
+            raise ValueError('only ordered data format is supported!')
 
     def ordered_zone(self, pltFile):
 
         self.imax = pltFile.read_integer()
         self.jmax = pltFile.read_integer()
         self.kmax = pltFile.read_integer()
+        self._set_cells()
+
+    def _set_cells(self):
         self.iCell = 1 if self.imax == 1 else self.imax-1
         self.jCell = 1 if self.jmax == 1 else self.jmax-1
         self.kCell = 1 if self.kmax == 1 else self.kmax-1
@@ -122,7 +286,11 @@ class Zone(object):
         self.numPoints = self.imax * self.jmax * self.kmax
         self.numCells = self.iCell * self.jCell * self.kCell
 
-    def read_variable(self, varIdx, pltFile):
+    def _block_layout(self, varIdx):
+        '''
+        number of values stored in the block of variable varIdx
+        and the shape of the block in Fortran order
+        '''
         if self.variablesLocation[varIdx] == 0:
             num = self.numPoints
             out_shape = (self.imax, self.jmax, self.kmax)
@@ -131,42 +299,311 @@ class Zone(object):
             # out_shape = (self.iCell, self.jCell, self.kmax)
             num = self.imax*self.jmax*self.kCell
             out_shape = (self.imax, self.jmax, self.kCell)
-        vfmt = self.variablesFormat[varIdx]
-        if vfmt == __TEC_FLOAT__:
-            data = pltFile.read_float_list(num)
-        elif vfmt == __TEC_DOUBLE__:
-            data = pltFile.read_double_list(num)
-        elif vfmt == __TEC_LONG_INT__:
-            data = pltFile.read_long_list(num)
-        elif vfmt == __TEC_INT__:
-            data = pltFile.read_integer_list(num)
-        else:
-            print("type of data not supported: {}".format(vfmt))
-            sys.exit(1)
+        return num, out_shape
+
+    def to_index(self):
+        '''
+        entry of the zone in the sidecar index
+        '''
+        return {
+            'name': self.name,
+            'strandId': self.strand_id,
+            'solutionTime': self.solutiontime,
+            'type': self.type,
+            'packing': self.datapacking,
+            'shape': [self.imax, self.jmax, self.kmax],
+            'locations': list(self.variablesLocation),
+            'formats': list(self.variablesFormat),
+            'passive': list(self.passiveVariables),
+            'sharing': list(self.sharingVariables),
+            'dataOffset': self.dataOffset,
+            'offsets': list(self.variablesOffset),
+            'min': list(self.min_value),
+            'max': list(self.max_value),
+        }
+
+    def load_index(self, entry):
+        '''
+        restore the zone from its entry in the sidecar index
+        '''
+        self.name = entry['name']
+        self.strand_id = entry['strandId']
+        self.solutiontime = entry['solutionTime']
+        self.type = entry['type']
+        self.datapacking = entry['packing']
+        self.imax, self.jmax, self.kmax = entry['shape']
+        self._set_cells()
+        self.variablesLocation = entry['locations']
+        self.variablesFormat = entry['formats']
+        self.passiveVariables = entry['passive']
+        self.sharingVariables = entry['sharing']
+        self.min_value = entry['min']
+        self.max_value = entry['max']
+        self.build_offset_index(entry['dataOffset'])
+
+    def variable_shape(self, varIdx):
+        '''
+        shape of the array of variable varIdx, ghost cells excluded
+        '''
+        if self.variablesLocation[varIdx] == 0:
+            return (self.imax, self.jmax, self.kmax)
+        return (self.iCell, self.jCell, self.kCell)
+
+    def _sharing_defaults(self):
+        if not self.passiveVariables:
+            self.passiveVariables = [0]*self.numOfVariables
+        if not self.sharingVariables:
+            self.sharingVariables = [-1]*self.numOfVariables
+        if not self.sharedZones:
+            self.sharedZones = [None]*self.numOfVariables
+
+    def link_shared(self, zones):
+        '''
+        resolve the zones the variables are shared with, zones is the list of the
+        zones of the file, a variable is always shared with a previous zone
+        '''
+        self._sharing_defaults()
+        self.sharedZones = [zones[s] if s >= 0 else None for s in self.sharingVariables]
+
+    def is_stored(self, varIdx):
+        '''
+        whether the values of variable varIdx are stored in the data of this zone,
+        shared and passive variables are not
+        '''
+        return self.sharingVariables[varIdx] < 0 and not self.passiveVariables[varIdx]
+
+    def build_offset_index(self, dataOffset):
+        '''
+        record the byte offset and dtype of every variable block.
+        dataOffset is the file position right after the min/max values,
+        the offset of the end of the zone data is returned.
+        shared and passive variables have no block, their offset is None.
+        in a POINT zone, the offset of a variable is the one of its first value.
+        '''
+        self._sharing_defaults()
+        self.dataOffset = dataOffset
+        self.variablesOffset = []
+        self.variablesDtype = []
+        offset = dataOffset
+        for varIdx in range(self.numOfVariables):
+            vfmt = self.variablesFormat[varIdx]
+            if vfmt not in __TEC_DTYPES__:
+                raise ValueError("type of data not supported: {}".format(vfmt))
+            dtype = __TEC_DTYPES__[vfmt]
+            self.variablesDtype.append(dtype)
+            if not self.is_stored(varIdx):
+                self.variablesOffset.append(None)
+                continue
+            num, _ = self._block_layout(varIdx)
+            self.variablesOffset.append(offset)
+            offset += num*dtype.itemsize
+        self.data = [None]*self.numOfVariables
+        if self.datapacking == __POINT__:
+            return self._build_point_dtype()
+        return offset
+
+    def _build_point_dtype(self):
+        '''
+        a point of a POINT zone holds the values of the stored variables one after the other,
+        the fields of the packed structured dtype are named by the variable index
+        '''
+        stored = [var for var in range(self.numOfVariables) if self.is_stored(var)]
+        if any(self.variablesLocation[var] != 0 for var in stored):
+            raise ValueError("zone {} is POINT packed, its variables must be at the vertices".format(
+                self.name))
+        self.pointDtype = np.dtype({'names': [str(var) for var in stored],
+                                    'formats': [self.variablesDtype[var] for var in stored]})
+        for var in stored:
+            self.variablesOffset[var] = self.dataOffset + self.pointDtype.fields[str(var)][1]
+        self.points = None
+        return self.dataOffset + self.numPoints*self.pointDtype.itemsize
+
+    def _point_variable(self, varIdx, points):
+        '''
+        variable varIdx of a POINT zone as a strided view of its points
+        '''
+        return points[str(varIdx)].reshape((self.imax, self.jmax, self.kmax), order='F')
+
+    def read_points(self, pltFile):
+        '''
+        decode every point of a POINT zone at once, the variables are views of them
+        '''
+        if self.points is None:
+            pltFile.seek(self.dataOffset)
+            with pltFile.timer('decode'):
+                self.points = pltFile.read_array(self.pointDtype, self.numPoints)
+        return self.points
+
+    def read_variable(self, varIdx, pltFile, out=None):
+        '''
+        read variable varIdx, if out is given the data is stored in it,
+        vertex data of the same dtype is read straight into an F-contiguous out.
+        '''
+        if self.sharedZones[varIdx] is not None:
+            return self.sharedZones[varIdx].read_variable(varIdx, pltFile, out)
+        if self.passiveVariables[varIdx]:
+            if out is None:
+                return self.passive_variable(varIdx)
+            out[...] = 0
+            return out
+        if self.datapacking == __POINT__:
+            np_array = self._point_variable(varIdx, self.read_points(pltFile))
+            if out is not None:
+                out[...] = np_array
+                np_array = out
+            return np_array
+        num, out_shape = self._block_layout(varIdx)
+        dtype = self.variablesDtype[varIdx]
+        pltFile.seek(self.variablesOffset[varIdx])
+        if (out is not None and self.variablesLocation[varIdx] == 0
+                and out.dtype == dtype and out.flags.f_contiguous):
+            with pltFile.timer('decode'):
+                pltFile.read_array(dtype, num, out=out.reshape(-1, order='F'))
+            return out
+        # decode the whole block into one buffer, reshape and trim are views
+        with pltFile.timer('decode'):
+            data = pltFile.read_array(dtype, num)
+        with pltFile.timer('reshape'):
+            np_array = data.reshape(out_shape, order='F')
+            if self.variablesLocation[varIdx] != 0:
+                # np_array = np_array[:, :, :-1]
+                np_array = np_array[0:self.iCell, 0:self.jCell, :]
+            if out is not None:
+                out[...] = np_array
+                np_array = out
+        return np_array
+
+    def read_variable_slab(self, varIdx, pltFile, i=slice(None), j=slice(None), k=slice(None)):
+        '''
+        read the sub-box [i, j, k] of variable varIdx without reading the whole block.
+        i, j, k are slices over the valid (ghost-free) extents, every k-plane of the
+        sub-box is read as one contiguous run of j-rows, a unit-stride k-range of
+        full planes is read at once.
+        '''
+        _, out_shape = self._block_layout(varIdx)
+        imax, jmax = out_shape[0], out_shape[1]
         if self.variablesLocation[varIdx] == 0:
-            np_array = np.array(data).reshape(out_shape, order='F')
+            ni, nj, nk = out_shape
         else:
-            np_array = np.array(data).reshape(out_shape, order='F')
-            # np_array = np_array[:, :, :-1]
+            ni, nj, nk = self.iCell, self.jCell, self.kCell
+        iIdx = range(*i.indices(ni))
+        jIdx = range(*j.indices(nj))
+        kIdx = range(*k.indices(nk))
+        dtype = self.variablesDtype[varIdx]
+        if len(iIdx) == 0 or len(jIdx) == 0 or len(kIdx) == 0:
+            return np.empty((len(iIdx), len(jIdx), len(kIdx)), dtype=dtype, order='F')
+        if self.datapacking == __POINT__:
+            # the points of the k-planes of the sub-box are read at once
+            klo, khi = min(kIdx), max(kIdx)+1
+            pltFile.seek(self.dataOffset + klo*imax*jmax*self.pointDtype.itemsize)
+            points = pltFile.read_array(self.pointDtype, imax*jmax*(khi-klo))
+            block = points[str(varIdx)].reshape((imax, jmax, khi-klo), order='F')
+            return block[i, j, _local_slice(kIdx, klo)]
+
+        jlo, jhi = min(jIdx), max(jIdx)+1
+        iSel = _local_slice(iIdx, 0)
+        jSel = _local_slice(jIdx, jlo)
+        rowBytes = imax*dtype.itemsize
+        planeBytes = imax*jmax*dtype.itemsize
+        offset = self.variablesOffset[varIdx]
+        if kIdx.step == 1 and jlo == 0 and jhi == nj:
+            # full planes, with the ghost row of cell-centered data sliced off
+            pltFile.seek(offset + kIdx.start*planeBytes)
+            block = pltFile.read_array(dtype, imax*jmax*len(kIdx)).reshape(
+                (imax, jmax, len(kIdx)), order='F')
+            return block[iSel, jSel, :]
+
+        slab = np.empty((len(iIdx), len(jIdx), len(kIdx)), dtype=dtype, order='F')
+        for n, kk in enumerate(kIdx):
+            pltFile.seek(offset + kk*planeBytes + jlo*rowBytes)
+            plane = pltFile.read_array(dtype, imax*(jhi-jlo)).reshape(
+                (imax, jhi-jlo), order='F')
+            slab[:, :, n] = plane[iSel, jSel]
+        return slab
+
+    def read_slab(self, var_id, i=slice(None), j=slice(None), k=slice(None)):
+        '''
+        access the sub-box [i, j, k] of a variable, loaded or mapped data is
+        sliced directly, otherwise only the sub-box is read from file
+        '''
+        if self.sharedZones[var_id] is not None:
+            return self.sharedZones[var_id].read_slab(var_id, i, j, k)
+        if (self.data[var_id] is not None or self.mapSource is not None
+                or self.passiveVariables[var_id]):
+            return self[var_id][i, j, k]
+        return self.read_variable_slab(var_id, self.pltFile, i, j, k)
+
+    def passive_variable(self, varIdx):
+        '''
+        a passive variable is zero everywhere, it is a read-only view of a single zero
+        '''
+        return np.broadcast_to(np.zeros((), dtype=self.variablesDtype[varIdx]),
+                               self.variable_shape(varIdx))
+
+    def map_variable(self, varIdx, source):
+        '''
+        map the block of variable varIdx as a read-only np.memmap of a file name,
+        or as a view of a memoryview holding the file,
+        cell-centered data is a sliced view without the ghost cells
+        '''
+        if self.datapacking == __POINT__:
+            if isinstance(source, memoryview):
+                points = np.ndarray((self.numPoints,), dtype=self.pointDtype, buffer=source,
+                                    offset=self.dataOffset)
+            else:
+                points = np.memmap(source, dtype=self.pointDtype, mode='r',
+                                   offset=self.dataOffset, shape=(self.numPoints,))
+            return self._point_variable(varIdx, points)
+        _, out_shape = self._block_layout(varIdx)
+        if isinstance(source, memoryview):
+            np_array = np.ndarray(out_shape, dtype=self.variablesDtype[varIdx], buffer=source,
+                                  offset=self.variablesOffset[varIdx], order='F')
+        else:
+            np_array = np.memmap(source, dtype=self.variablesDtype[varIdx], mode='r',
+                                 offset=self.variablesOffset[varIdx], shape=out_shape, order='F')
+        if self.variablesLocation[varIdx] != 0:
             np_array = np_array[0:self.iCell, 0:self.jCell, :]
         return np_array
 
     def read_minmax_of_values(self, pltFile):
-
-        for _ in range(self.numOfVariables):
-            self.min_value.append(pltFile.read_double())
-            self.max_value.append(pltFile.read_double())
+        '''
+        only the stored variables have min/max in the file, shared variables
+        take those of their zone and passive variables are 0.0
+        '''
+        for var in range(self.numOfVariables):
+            if self.sharedZones[var] is not None:
+                self.min_value.append(self.sharedZones[var].min_value[var])
+                self.max_value.append(self.sharedZones[var].max_value[var])
+            elif self.passiveVariables[var]:
+                self.min_value.append(0.0)
+                self.max_value.append(0.0)
+            else:
+                self.min_value.append(pltFile.read_double())
+                self.max_value.append(pltFile.read_double())
 
     def read_data(self, pltFile):
         for var in range(self.numOfVariables):
-            self.data.append(self.read_variable(var, pltFile))
+            if self.is_stored(var):
+                self.data[var] = self.read_variable(var, pltFile)
+            else:
+                self[var]
 
     # access by index
 
     def __getitem__(self, var_id):
         '''
-        access data by index
+        access data by index, a lazily loaded variable is read on first access
         '''
+        if self.data[var_id] is None:
+            if self.sharedZones[var_id] is not None:
+                # the very nd-array of the zone the variable is shared with
+                self.data[var_id] = self.sharedZones[var_id][var_id]
+            elif self.passiveVariables[var_id]:
+                self.data[var_id] = self.passive_variable(var_id)
+            elif self.mapSource is not None:
+                self.data[var_id] = self.map_variable(var_id, self.mapSource)
+            else:
+                self.data[var_id] = self.read_variable(var_id, self.pltFile)
         return self.data[var_id]
 
     def __repr__(self):
@@ -193,9 +630,34 @@ class Zone(object):
 
 
 class TecplotBinaryReader():
-    def __init__(self, filename, info=False):
+    '''tecplot file reader.
+    initialization parameters:
+        filename :  string, path of the plt file, or the file in memory as bytes, bytearray,
+                    memoryview or io.BytesIO, or a binary file object
+        info     :  bool, print the file and zone information
+        lazy     :  bool, only read the head section and index the variable blocks,
+                    every variable is read on its first access. default is False
+        mmap     :  bool, expose every variable as a read-only np.memmap of the file
+                    instead of reading it, implies lazy. default is False.
+                    the variables of a file in memory are always views of its buffer,
+                    nothing is copied.
+        index    :  bool, restore the head section from the sidecar index of the file if it
+                    is up to date, otherwise parse the file and write the index. default is False.
+                    only a file given by its path has an index
+        stats    :  PltStats, record I/O counters and phase timings in it. default is None
+        pool     :  HandlePool, share a bounded number of open files with other readers,
+                    the file of a path is then opened on demand. default is None
+    the file is kept open for the lazily loaded variables until close() is called,
+    the reader is a context manager closing it.
+    '''
+
+    def __init__(self, filename, info=False, lazy=False, mmap=False, index=False, stats=None,
+                 pool=None):
         self.filename = filename
-        self.pltFile = PltFile(filename)
+        self.stats = stats
+        self.pltFile = PltFile(filename, stats=stats, pool=pool)
+        if index and self.pltFile.filename is None:
+            raise ValueError("only a file given by its path has a sidecar index")
 
         self.version = ""
         self.byte_order = int()
@@ -205,10 +667,38 @@ class TecplotBinaryReader():
         self.variablesName = []
         self.variablesLocation = []
         self.zone = []  # in most cases, there is only one zone
+        # byte range of the data section, from the first zone marker after the EOH marker
+        self.dataSectionOffset = int()
+        self.dataSectionEnd = int()
+
+        entry = load_index(filename) if index else None
+        if entry is not None:
+            self.__load_index(entry)
+        else:
+            self.__read_head()
+            if index:
+                save_index(filename, self.__to_index())
 
-        self.version = self.pltFile._read_line(8).decode('utf-8')
-        self.__verification()
-        self.__read_file_info()
+        for z in self.zone:
+            z.pltFile = self.pltFile
+            if self.pltFile.buffer is not None:
+                z.mapSource = self.pltFile.buffer
+            elif mmap:
+                z.mapSource = filename
+            elif not lazy:
+                z.read_data(self.pltFile)
+
+        if info:
+            self.__repr__()
+
+    def __read_head(self):
+        '''
+        parse the head section and the preamble of the data section of every zone
+        '''
+        with self.pltFile.timer('file_info'):
+            self.version = self.pltFile._read_line(8).decode('utf-8')
+            self.__verification()
+            self.__read_file_info()
 
         # Zone
         zonecounter = -1
@@ -217,7 +707,8 @@ class TecplotBinaryReader():
         while (vm != __EOH__):
             if vm == __ZONE__:
                 z = Zone(self.numVariables)
-                z._read_zone_vars(self.pltFile)
+                with self.pltFile.timer('zone_vars'):
+                    z._read_zone_vars(self.pltFile, int(self.version[5:]))
                 self.zone.append(z)
                 vm = self.__get_AuxiliaryMarker()
                 assert vm == 0
@@ -229,61 +720,174 @@ class TecplotBinaryReader():
             vm = self.__get_ValidationMarker()
         # end while
 
+        self.dataSectionOffset = self.pltFile.tell()
         for z in self.zone:
-            assert self.__get_ValidationMarker() == __ZONE__
-            z.variablesFormat = self.pltFile.read_integer_list(
-                self.numVariables)
-            hasPassive = self.pltFile.read_integer()
-            assert hasPassive == 0
-            if hasPassive == 1:
-                z.passiveVariables = self.pltFile.read_integer_list(
-                    self.numVariables)
-            hasSharing = self.pltFile.read_integer()
-            assert hasSharing == 0
-            if hasSharing == 1:
-                z.sharingVariables = self.pltFile.read_integer_list(
-                    self.numVariables)
-            zoneShare = self.pltFile.read_integer()  # no use
-
-            z.read_minmax_of_values(self.pltFile)
-            z.read_data(self.pltFile)
+            with self.pltFile.timer('data_preamble'):
+                self.__read_data_preamble(z)
+        self.dataSectionEnd = self.pltFile.tell()
 
-        if info:
-            self.__repr__()
+    def __read_data_preamble(self, z):
+        '''
+        read the formats, min and max of the variables of a zone and index its blocks,
+        the file is left at the end of the zone data
+        '''
+        assert self.__get_ValidationMarker() == __ZONE__
+        z.variablesFormat = self.pltFile.read_integer_list(
+            self.numVariables)
+        hasPassive = self.pltFile.read_integer()
+        if hasPassive == 1:
+            z.passiveVariables = list(self.pltFile.read_integer_list(
+                self.numVariables))
+        hasSharing = self.pltFile.read_integer()
+        if hasSharing == 1:
+            z.sharingVariables = list(self.pltFile.read_integer_list(
+                self.numVariables))
+        zoneShare = self.pltFile.read_integer()  # no use
+        z.link_shared(self.zone)
+
+        z.minmaxOffset = self.pltFile.tell()
+        z.read_minmax_of_values(self.pltFile)
+        zoneEnd = z.build_offset_index(self.pltFile.tell())
+        self.pltFile.seek(zoneEnd)
+
+    def __to_index(self):
+        return {
+            'version': self.version,
+            'byteOrder': self.byte_order,
+            'fileType': self.file_type,
+            'title': self.title,
+            'variables': self.variablesName,
+            'dataSection': [self.dataSectionOffset, self.dataSectionEnd],
+            'zones': [z.to_index() for z in self.zone],
+        }
+
+    def __load_index(self, entry):
+        self.version = entry['version']
+        self.byte_order = entry['byteOrder']
+        self.file_type = entry['fileType']
+        self.title = entry['title']
+        self.variablesName = entry['variables']
+        self.numVariables = len(self.variablesName)
+        self.dataSectionOffset, self.dataSectionEnd = entry['dataSection']
+        for zoneEntry in entry['zones']:
+            z = Zone(self.numVariables)
+            z.load_index(zoneEntry)
+            z.link_shared(self.zone)
+            self.zone.append(z)
+
+    def close(self):
+        '''
+        close the file, the variables which are not loaded yet can't be read anymore
+        '''
+        self.pltFile.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def __getitem__(self, var_id):
         '''
-        access data by index
+        access data by index, or by (zone, var) where both are an index or a name
         '''
+        if isinstance(var_id, tuple):
+            zone, var = var_id
+            return self.get_zone(zone)[self.__var_index(var)]
         return self.zone[0][var_id]
 
+    def get_zone(self, zone=0):
+        '''
+        zone given by index or name
+        '''
+        if isinstance(zone, str):
+            return self.zone[self.get_zone_names().index(zone)]
+        return self.zone[zone]
+
+    def get_zone_names(self):
+        return [z.name for z in self.zone]
+
     # access by name
-    def get_data_by_name(self, var_name):
+    def get_data_by_name(self, var_name, zone=0):
         '''
         access data by name
         '''
-        return self.zone[0][self.variablesName.index(var_name)]
+        return self.get_zone(zone)[self.variablesName.index(var_name)]
+
+    def read(self, var, i=slice(None), j=slice(None), k=slice(None), zone=0):
+        '''
+        read the sub-box [i, j, k] of a variable given by name or index,
+        in lazy mode only the bytes of the sub-box are read from file
+        '''
+        return self.get_zone(zone).read_slab(self.__var_index(var), i, j, k)
 
     def get_name_list(self):
         return self.variablesName
 
-    def get_shape(self):
-        return (self.zone[0].imax, self.zone[0].jmax, self.zone[0].kmax)
+    def get_shape(self, zone=0):
+        z = self.get_zone(zone)
+        return (z.imax, z.jmax, z.kmax)
 
-    def get_location_list(self):
-        return self.zone[0].variablesLocation
+    def get_location_list(self, zone=0):
+        return self.get_zone(zone).variablesLocation
 
     def get_name(self, varIdx):
         return self.variablesName[varIdx]
 
-    def get_location(self, varIdx):
-        return self.zone[0].variablesLocation[varIdx]
+    def get_location(self, varIdx, zone=0):
+        return self.get_zone(zone).variablesLocation[varIdx]
 
-    def get_data_list(self):
-        return self.zone[0].data
+    def get_data_list(self, zone=0):
+        z = self.get_zone(zone)
+        return [z[i] for i in range(self.numVariables)]
 
-    def get_format(self, varIdx):
-        vf = self.zone[0].variablesFormat[varIdx]
+    def reduce(self, var, ops=('mean',), chunkBytes=1 << 26, bins=64, range=None, zone=0):
+        '''
+        statistics of a variable, given by name or index, streamed in chunks of k-planes
+        of about chunkBytes without reading the whole variable.
+        ops is a list of 'sum', 'mean', 'rms', 'std', 'min', 'max', 'hist' and 'ksum',
+        the histogram has bins bins over range, default is the min/max in the file.
+        return: dict of statistic name to value, see Reduction.result
+        '''
+        z = self.get_zone(zone)
+        varIdx = self.__var_index(var)
+        if range is None:
+            range = (z.min_value[varIdx], z.max_value[varIdx])
+        return reduce_zone(z, varIdx, Reduction(ops, bins, range), chunkBytes).result()
+
+    def to_shared(self, varList=None, zone=0):
+        '''
+        decode variables, given by name or index, default is all, straight into
+        shared memory blocks, e.g. to hand them to a multiprocessing pool without pickling
+        the data.
+        return:
+            list of SharedField, picklable handles of the F-ordered variables.
+            the caller unlinks them once the consumers are done.
+        '''
+        z = self.get_zone(zone)
+        if varList is None:
+            varList = range(self.numVariables)
+        fields = []
+        try:
+            for var in varList:
+                varIdx = self.__var_index(var)
+                field = SharedField.create(z.variable_shape(varIdx), z.variablesDtype[varIdx])
+                fields.append(field)
+                out = field.attach()
+                if z.data[varIdx] is not None:
+                    out[...] = z.data[varIdx]
+                else:
+                    z.read_variable(varIdx, self.pltFile, out=out)
+                del out
+        except BaseException:
+            for field in fields:
+                field.unlink()
+                field.close()
+            raise
+        return fields
+
+    def get_format(self, varIdx, zone=0):
+        vf = self.get_zone(zone).variablesFormat[varIdx]
         if vf == 1:
             return np.float32
         elif vf == 2:
@@ -293,36 +897,52 @@ class TecplotBinaryReader():
         elif vf == 4:
             return np.int32
 
-    def vertex_to_center(self, varIdx=0, varName=''):
+    def vertex_to_center(self, varIdx=0, varName='', out=None, zone=0):
+        '''
+        average a vertex variable to cell centers, the result is stored in out if given
+        '''
         if varName != '':
             varIdx = self.variablesName.index(varName)
-        if self.get_location(varIdx) == 0:
-            var = self.zone[0][varIdx]
-            if self.zone[0].kCell < self.zone[0].kmax:
-                varCij = np.empty(
-                    (self.zone[0].imax, self.zone[0].jmax, self.zone[0].kCell))
-                varCij = 0.5*(var[:, :, 0:-1]+var[:, :, 1:])
-            else:
-                varCij = var
-            if self.zone[0].jCell < self.zone[0].jmax:
-                varCi = np.empty(
-                    (self.zone[0].imax, self.zone[0].iCell, self.zone[0].kCell))
-                varCi = 0.5*(varCij[:, 0:-1, :]+varCij[:, 1:, :])
-            else:
-                varCi = varCij
+        if self.get_location(varIdx, zone) == 0:
+            return average_to_center(self.get_zone(zone)[varIdx], out=out)
+        else:
+            print('this var is already located at cell center, no need to be converted.')
+            return
 
-            if self.zone[0].iCell < self.zone[0].imax:
-                varC = np.empty(
-                    (self.zone[0].iCell, self.zone[0].jCell, self.zone[0].kCell))
-                varC = 0.5*(varCi[0:-1, :, :]+varCi[1:, :, :])
-            else:
-                varC = varCi
-            return varC
+    def vertices_to_centers(self, varList, out=None, zone=0):
+        '''
+        average a list of vertex variables, given by name or index, to cell centers
+        in one pass. the result is a (nvar, iCell, jCell, kCell) array, stored in out if given.
+        '''
+        z = self.get_zone(zone)
+        if out is None:
+            out = field_array((len(varList),), (z.iCell, z.jCell, z.kCell),
+                              np.result_type(*[_center_dtype(self.get_format(
+                                  self.__var_index(v), zone)) for v in varList]))
+        for n, var in enumerate(varList):
+            varIdx = self.__var_index(var)
+            if z.variablesLocation[varIdx] != 0:
+                raise ValueError("variable {} is not located at vertices".format(
+                    self.variablesName[varIdx]))
+            average_to_center(z[varIdx], out=out[n])
+        return out
 
+    def center_to_vertex(self, varIdx=0, varName='', out=None, zone=0):
+        '''
+        average a cell-centered variable to vertices, the result is stored in out if given
+        '''
+        if varName != '':
+            varIdx = self.variablesName.index(varName)
+        if self.get_location(varIdx, zone) == 1:
+            z = self.get_zone(zone)
+            return average_to_vertex(z[varIdx], (z.imax, z.jmax, z.kmax), out=out)
         else:
-            print('this var is already located at cell center, no need to be converted.')
+            print('this var is already located at vertex, no need to be converted.')
             return
 
+    def __var_index(self, var):
+        return self.variablesName.index(var) if isinstance(var, str) else var
+
     def __get_ValidationMarker(self):
         return self.pltFile.read_float()
 
@@ -330,9 +950,10 @@ class TecplotBinaryReader():
         return self.pltFile.read_integer()
 
     def __verification(self):
-        if not self.version == "#!TDV112":
+        if not (self.version.startswith("#!TDV") and self.version[5:].isdigit()
+                and int(self.version[5:]) in __TEC_VERSIONS__):
             raise Exception(
-                "UnSupported Format. We get {} instead of #!TDV112".format(self.version))
+                "UnSupported Format. We get {} instead of #!TDV111 or #!TDV112".format(self.version))
 
     def _read_auxiliary(self, pltFile):
         self.auxiliary = pltFile.read_integer()
@@ -389,104 +1010,420 @@ class TecplotBinaryReader():
 class TecplotBinaryWriter():
     '''tecplot file writer.
     initialization parameters:
-        filename :  string, save path and file name
-        vars     :  list of numpy nd-array 
+        filename :  string, save path and file name, or a writable and seekable binary
+                    file object such as io.BytesIO, which is left open by close()
+        vars     :  list of numpy nd-array, if None, only the head section is written and
+                    the data is written slab by slab with write_slab, then close() is called
         varsName :  list of string, names of every variable, if default, set to V1, V2...
+                    without vars, varsName or varsLoc is required to tell the number of variables
         varsLoc  :  list of [0|1], data location, 0: vertex; 1: cell-centered, default is 0
-        dataFormat : 'f' or 'd', denotes float or double
+        dataFormat : format of all variables or a list of the format of every variable.
+                     a format is 'f', 'd', 'i' or 'l', denoting float, double, int32 or int64,
+                     a numpy dtype, or 'auto' to use the dtype of the variable in vars
+        shape    :  (imax, jmax, kmax) of the vertex grid, required if vars is None,
+                    together with varsName or varsLoc
+        stats    :  PltStats, record I/O counters and phase timings in it. default is None
+        title    :  string, title of the dataset
+        zoneName, strandId, solutionTime : header of the zone
+        dataPacking : 'block' or 'point', a POINT zone stores the values of all variables
+                    point after point, its variables must be at the vertices and are written
+                    together by write_points. a file with POINT zones is written as #!TDV111,
+                    the last version whose zone header carries the data packing.
+        zones    :  list of dict, one per zone, to write several ordered zones into one file.
+                    the keys are 'vars' or 'shape', and optionally 'varsLoc', 'dataFormat',
+                    'dataPacking', 'name', 'strandId', 'solutionTime'; missing keys fall back to the
+                    arguments above, except 'name' which is 'Zone n' for the n-th zone so that
+                    the zones have distinct names. vars, shape and zoneName are ignored if
+                    zones is given.
+                    'sharedVars' maps variables (name or index) to the previous zone
+                    (index or name) they are shared with, 'passiveVars' lists the
+                    variables without values; neither is stored, their entry in 'vars'
+                    may be None.
+                    the file is closed after writing if every zone has 'vars'.
+        workers  :  int, number of threads writing the variable blocks concurrently with
+                    positional writes into the preallocated file, write_slab and write_points
+                    may then be called from several threads. requires a path. default is
+                    None, the blocks are written one after the other
     '''
 
-    def __init__(self, filename, vars,  varsName=None, varsLoc=None, dataFormat='f'):
+    def __init__(self, filename, vars=None,  varsName=None, varsLoc=None, dataFormat='f', shape=None,
+                 stats=None, title='Simple Dataset', zoneName='Simple Zone', strandId=-1, solutionTime=0.0,
+                 zones=None, dataPacking='block', workers=None):
         self.filename = filename
-        self.pltFile = PltFile(filename, mode='wb')
-        self.ndim = 0
-        nVars = len(vars)
+        self.stats = stats
+        self.title = title
+        if zones is None:
+            zones = [{'vars': vars, 'shape': shape, 'name': zoneName,
+                      'strandId': strandId, 'solutionTime': solutionTime}]
+        if varsName is not None:
+            nVars = len(varsName)
+        elif zones[0].get('vars') is not None:
+            nVars = len(zones[0]['vars'])
+        elif zones[0].get('varsLoc', varsLoc) is not None:
+            nVars = len(zones[0].get('varsLoc', varsLoc))
+        else:
+            raise ValueError("streaming mode, without vars, requires varsName or varsLoc to tell "
+                             "the number of variables")
+        if workers is not None and (not isinstance(filename, (str, os.PathLike))
+                                    or not hasattr(os, 'pwrite')):
+            raise ValueError("concurrent writing requires a path and os.pwrite")
+        self.pltFile = PltFile(filename, mode='wb', stats=stats)
+        self.workers = workers
+        # guards the min and max of the zones, slabs may be written from several threads
+        self.minmaxLock = threading.Lock()
         if varsName is None:
             varsName = []
             for i in range(nVars):
                 varsName.append('V{:d}'.format(i+1))
         if varsLoc is None:
             varsLoc = [0]*nVars
+        self.nVars = nVars
+        self.varsName = varsName
+        self.varsLoc = varsLoc
+        self.dataFormat = dataFormat
+        self.dataPacking = dataPacking
+        self.strandId = strandId
+        self.solutionTime = solutionTime
 
-        for i, var in enumerate(vars):
-            self.ndim = max(np.squeeze(var).ndim, self.ndim)
-            if var.ndim == 1:
-                vars[i] = np.expand_dims(var, axis=(0, 1))
-            elif var.ndim == 2:
-                vars[i] = np.expand_dims(var, axis=0)
-            elif var.ndim == 3:
-                pass
+        self.zone = []
+        zoneVars = []
+        for n, spec in enumerate(zones):
+            z, vars = self._make_zone(n, spec)
+            self.zone.append(z)
+            zoneVars.append(vars)
+        self._write_head()
+        if workers is not None:
+            self.__preallocate()
+        # write data of variables
+        tasks = []
+        for n, vars in enumerate(zoneVars):
+            if vars is not None and self.zone[n].datapacking == __POINT__:
+                tasks.append((self.write_points, vars, 0, n))
+            elif vars is not None:
+                for i, var in enumerate(vars):
+                    if var is not None and self.zone[n].is_stored(i):
+                        tasks.append((self.write_slab, i, 0, var, n))
+        if workers is None:
+            for task in tasks:
+                task[0](*task[1:])
+        else:
+            # the offsets of all blocks are known, the blocks are written concurrently
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for future in [pool.submit(*task) for task in tasks]:
+                    future.result()
+        if all(vars is not None for vars in zoneVars):
+            self.close()
+
+    def _make_zone(self, n, spec):
+        '''
+        zone n of the file from its dict, the variables are returned as 3-d arrays
+        '''
+        vars = spec.get('vars')
+        varsLoc = spec.get('varsLoc', self.varsLoc)
+        dataFormat = spec.get('dataFormat', self.dataFormat)
+        z = Zone(self.nVars)
+        z.name = spec.get('name', 'Zone {:d}'.format(n+1))
+        z.strand_id = spec.get('strandId', self.strandId)
+        z.solutiontime = spec.get('solutionTime', self.solutionTime)
+        z.type = __ORDERED__
+        dataPacking = spec.get('dataPacking', self.dataPacking)
+        if dataPacking not in ('block', 'point'):
+            raise ValueError("dataPacking should be 'block' or 'point', got {}".format(dataPacking))
+        z.datapacking = __POINT__ if dataPacking == 'point' else __BLOCK__
+        z.variablesLocation = list(varsLoc)
+        z.passiveVariables = [0]*self.nVars
+        for var in spec.get('passiveVars', []):
+            z.passiveVariables[self.__var_index(var)] = 1
+        z.sharingVariables = [-1]*self.nVars
+        for var, source in spec.get('sharedVars', {}).items():
+            source = self.zone.index(self.get_zone(source))
+            z.sharingVariables[self.__var_index(var)] = source
+        z.link_shared(self.zone)
+        formats = dataFormat if isinstance(dataFormat, (list, tuple)) else [dataFormat]*self.nVars
+        z.variablesFormat = []
+        for i, fmt in enumerate(formats):
+            if z.sharedZones[i] is not None:
+                # a shared variable keeps the location and format of its zone
+                z.variablesLocation[i] = z.sharedZones[i].variablesLocation[i]
+                z.variablesFormat.append(z.sharedZones[i].variablesFormat[i])
+            elif z.passiveVariables[i] and (vars is None or vars[i] is None):
+                z.variablesFormat.append(_format_code('f' if isinstance(fmt, str) and fmt == 'auto' else fmt))
             else:
-                # 4d array is not supported
-                pass
+                z.variablesFormat.append(_format_code(fmt, vars[i] if vars is not None else None))
+
+        if vars is None:
+            shape = tuple(spec['shape'])
+            z.imax, z.jmax, z.kmax = (1,)*(3-len(shape)) + shape
+        else:
+            for i, var in enumerate(vars):
+                if var is None:
+                    pass
+                elif var.ndim == 1:
+                    vars[i] = np.expand_dims(var, axis=(0, 1))
+                elif var.ndim == 2:
+                    vars[i] = np.expand_dims(var, axis=0)
+                elif var.ndim == 3:
+                    pass
+                else:
+                    # 4d array is not supported
+                    pass
+            for i, loc in enumerate(z.variablesLocation):
+                if vars[i] is None or not z.is_stored(i):
+                    continue
+                if loc == 0:
+                    z.imax, z.jmax, z.kmax = vars[i].shape
+                    break
+                if loc == 1:
+                    iCell, jCell, kCell = vars[i].shape
+                    z.imax = iCell+1 if iCell > 1 else 1
+                    z.jmax = jCell+1 if jCell > 1 else 1
+                    z.kmax = kCell+1 if kCell > 1 else 1
+                    break
+        z._set_cells()
+        for source in z.sharedZones:
+            if source is not None and (source.imax, source.jmax, source.kmax) != (z.imax, z.jmax, z.kmax):
+                raise ValueError("zone {} shares variables with zone {} of another shape".format(
+                    z.name, source.name))
+        # min and max are accumulated by write_slab
+        z.min_value = [np.inf]*self.nVars
+        z.max_value = [-np.inf]*self.nVars
+        return z, vars
+
+    def __var_index(self, var):
+        return self.varsName.index(var) if isinstance(var, str) else var
+
+    def get_zone(self, zone=0):
+        '''
+        zone given by index or name
+        '''
+        if isinstance(zone, str):
+            return self.zone[[z.name for z in self.zone].index(zone)]
+        return self.zone[zone]
 
-        for i, loc in enumerate(varsLoc):
-            if loc == 0:
-                self.imax, self.jmax, self.kmax = vars[i].shape
-                self.iCell = max(self.imax-1, 1)
-                self.jCell = max(self.jmax-1, 1)
-                self.kCell = max(self.kmax-1, 1)
-                break
-            if loc == 1:
-                self.iCell, self.jCell, self.kCell = vars[i].shape
-                self.imax = self.iCell+1 if self.iCell > 1 else 1
-                self.jmax = self.jCell+1 if self.iCell > 1 else 1
-                self.kmax = self.kCell+1 if self.iCell > 1 else 1
-                break
-
-        self.pltFile.write_raw('#!TDV112'.encode('utf-8'))
+    def _write_head(self):
+        '''
+        write the head section and the preamble of the data section of every zone,
+        the offsets of the min/max values and of every variable block are recorded.
+        '''
+        with self.pltFile.timer('head'):
+            self.__write_head()
+
+    def __write_head(self):
+        # only a version up to 111 can tell a POINT zone
+        version = __TEC_POINT_VERSION__ if any(z.datapacking == __POINT__ for z in self.zone) else 112
+        self.pltFile.write_raw('#!TDV{:d}'.format(version).encode('utf-8'))
         self.pltFile.write_integer(1)  # byte_order
         self.pltFile.write_integer(0)  # file type
-        self.pltFile.write_string('Simple Dataset')
-        self.pltFile.write_integer(nVars)
-        for varName in varsName:
+        self.pltFile.write_string(self.title)
+        self.pltFile.write_integer(self.nVars)
+        for varName in self.varsName:
             self.pltFile.write_string(varName)
-        # write zone head
-        self.pltFile.write_float(__ZONE__)
-        self.pltFile.write_string('Simple Zone')  # zone name
-        self.pltFile.write_integer(-1)  # parentZone
-        self.pltFile.write_integer(-1)  # strand ID
-        self.pltFile.write_double(0.0)  # solution time
-        self.pltFile.write_integer(-1)  # not used
-        self.pltFile.write_integer(0)  # zone type, 0: ordered
-        self.pltFile.write_integer(1)  # var location flag
-        self.pltFile.write_integer_list(varsLoc)  # vars location
-        self.pltFile.write_integer(0)  # face neighbor
-        self.pltFile.write_integer(0)  # user-defined face neighbor
-        # shape
-        self.pltFile.write_integer_list([self.imax, self.jmax, self.kmax])
-        # auxiliary name/value
-        self.pltFile.write_integer(0)  # auxiliary name/value flag
+        for z in self.zone:
+            # write zone head
+            self.pltFile.write_float(__ZONE__)
+            self.pltFile.write_string(z.name)  # zone name
+            self.pltFile.write_integer(-1)  # parentZone
+            self.pltFile.write_integer(z.strand_id)  # strand ID
+            self.pltFile.write_double(z.solutiontime)  # solution time
+            self.pltFile.write_integer(-1)  # not used
+            self.pltFile.write_integer(z.type)  # zone type, 0: ordered
+            if version < 112:
+                self.pltFile.write_integer(z.datapacking)  # data packing, 0: block, 1: point
+            self.pltFile.write_integer(1)  # var location flag
+            self.pltFile.write_integer_list(z.variablesLocation)  # vars location
+            self.pltFile.write_integer(0)  # face neighbor
+            self.pltFile.write_integer(0)  # user-defined face neighbor
+            # shape
+            self.pltFile.write_integer_list([z.imax, z.jmax, z.kmax])
+            # auxiliary name/value
+            self.pltFile.write_integer(0)  # auxiliary name/value flag
         # end of head section
         self.pltFile.write_float(__EOH__)
-        # data section of zone
-        self.pltFile.write_float(__ZONE__)
-        varsFormat = [2]*nVars if dataFormat == 'd' else [1]*nVars
-        self.pltFile.write_integer_list(varsFormat)  # vars location
-        self.pltFile.write_integer(0)  # has passive variables
-        self.pltFile.write_integer(0)  # has sharing variables
-        self.pltFile.write_integer(-1)  # sharing zone number
-        # write min and max of variables
-        for var in vars:
-            self.pltFile.write_double(var.min())
-            self.pltFile.write_double(var.max())
-        # write data of variables
-        for loc, var in zip(varsLoc, vars):
-            if loc == 0:
-                pass
+        offset = self.dataSectionOffset = self.pltFile.tell()
+        for n, z in enumerate(self.zone):
+            # data section of zone, it starts after the data of the previous zone
+            if n > 0:
+                self.pltFile.seek(offset)
+            self.pltFile.write_float(__ZONE__)
+            self.pltFile.write_integer_list(z.variablesFormat)  # vars format
+            if any(z.passiveVariables):
+                self.pltFile.write_integer(1)  # has passive variables
+                self.pltFile.write_integer_list(z.passiveVariables)
             else:
-                if self.imax > self.iCell:
-                    var = np.append(var, np.zeros(
-                        (1, var.shape[1], var.shape[2])), axis=0)
-                # REVIEW: for 1/2-d array, the writting rule seems to be different.
-                if (self.ndim > 1 and self.jmax > self.jCell):
-                    var = np.append(var, np.zeros(
-                        (var.shape[0], 1, var.shape[2])), axis=1)
-            if dataFormat == 'd':
-                self.pltFile.write_double_list(
-                    var.reshape(-1, order='F').tolist())
+                self.pltFile.write_integer(0)  # has passive variables
+            if any(source >= 0 for source in z.sharingVariables):
+                self.pltFile.write_integer(1)  # has sharing variables
+                self.pltFile.write_integer_list(z.sharingVariables)
             else:
-                self.pltFile.write_float_list(
-                    var.reshape(-1, order='F').tolist())
+                self.pltFile.write_integer(0)  # has sharing variables
+            self.pltFile.write_integer(-1)  # sharing zone number
+            # write min and max of variables
+            z.minmaxOffset = self.pltFile.tell()
+            self._write_minmax(z)
+            # offset of every variable block
+            offset = z.build_offset_index(self.pltFile.tell())
+        self.dataSectionEnd = offset
 
-        self.pltFile.close()
+    def __preallocate(self):
+        '''
+        allocate the whole file once the head section is written, the blocks are then
+        written at their offsets by positional writes
+        '''
+        self.pltFile.flush()
+        fd = self.pltFile.fileno()
+        try:
+            os.posix_fallocate(fd, 0, self.dataSectionEnd)
+        except (AttributeError, OSError):
+            # e.g. a file system without fallocate, the file is extended sparsely
+            os.ftruncate(fd, self.dataSectionEnd)
+
+    def _write_minmax(self, z):
+        for var, (vmin, vmax) in enumerate(zip(z.min_value, z.max_value)):
+            if not z.is_stored(var):
+                continue
+            # a variable without any written slab is recorded as 0.0
+            self.pltFile.write_double(vmin if np.isfinite(vmin) else 0.0)
+            self.pltFile.write_double(vmax if np.isfinite(vmax) else 0.0)
+
+    def write_slab(self, var, k_start, array, zone=0):
+        '''
+        write the k-planes [k_start, k_start+nk) of a variable given by name or index
+        into a zone given by index or name.
+        array is (imax, jmax, nk) for vertex data and (iCell, jCell, nk) for
+        cell-centered data, 1/2-d grids leave out the leading dimensions as in vars.
+        '''
+        z = self.get_zone(zone)
+        var = self.__var_index(var)
+        if z.datapacking == __POINT__:
+            raise ValueError("zone {} is POINT packed, its variables are written by write_points".format(
+                z.name))
+        if not z.is_stored(var):
+            raise ValueError("variable {} of zone {} is shared or passive, it has no data".format(
+                self.varsName[var], z.name))
+        array = np.asarray(array)
+        if array.ndim < 3:
+            array = array.reshape((1,)*(3-array.ndim) + array.shape)
+        loc = z.variablesLocation[var]
+        ni, nj, nk = array.shape
+        if loc == 0:
+            shape, kExtent = (z.imax, z.jmax), z.kmax
+        else:
+            shape, kExtent = (z.iCell, z.jCell), z.kCell
+        if (ni, nj) != shape or k_start < 0 or k_start+nk > kExtent:
+            raise ValueError("slab of shape {} at k={:d} does not fit variable {} of shape {}".format(
+                array.shape, k_start, self.varsName[var], shape + (kExtent,)))
+        if array.size == 0:
+            return
+
+        with self.pltFile.timer('minmax'):
+            vmin, vmax = _stored_bounds(array, z.variablesDtype[var])
+            with self.minmaxLock:
+                z.min_value[var] = min(z.min_value[var], vmin)
+                z.max_value[var] = max(z.max_value[var], vmax)
+        with self.pltFile.timer('write'):
+            self.__write_data(z, var, k_start, array)
+
+    def __write_data(self, z, var, k_start, array):
+        ni, nj, nk = array.shape
+        dtype = z.variablesDtype[var]
+        offset = z.variablesOffset[var] + k_start*z.imax*z.jmax*dtype.itemsize
+        if self.workers is None:
+            self.pltFile.seek(offset)
+        padded = (ni, nj) != (z.imax, z.jmax)
+        if not padded and array.dtype == dtype and array.flags.f_contiguous:
+            # the buffer of the array is written as it is
+            self.__write_array(array, dtype, offset)
+            return
+
+        # copy chunks of k-planes into one reused buffer, casting and reordering on the fly.
+        # cell-centered data aligns the two fast moving indices with ghost cells,
+        # which are zeroed once and never overwritten.
+        planeBytes = z.imax*z.jmax*dtype.itemsize
+        nkChunk = max(1, min(nk, __WRITE_CHUNK_BYTES__//planeBytes))
+        chunk = np.zeros((z.imax, z.jmax, nkChunk), dtype=dtype, order='F')
+        for k0 in range(0, nk, nkChunk):
+            k1 = min(k0+nkChunk, nk)
+            chunk[0:ni, 0:nj, 0:k1-k0] = array[:, :, k0:k1]
+            self.__write_array(chunk[:, :, 0:k1-k0], dtype, offset + k0*planeBytes)
+
+    def __write_array(self, array, dtype, offset):
+        '''
+        write at the position of the file, which is offset, or at offset by a
+        positional write when the blocks are written concurrently
+        '''
+        if self.workers is None:
+            self.pltFile.write_array(array, dtype)
+        else:
+            self.pltFile.pwrite_array(array, dtype, offset)
+
+    def write_points(self, vars, k_start=0, zone=0):
+        '''
+        write the k-planes [k_start, k_start+nk) of every variable of a POINT zone,
+        vars holds one (imax, jmax, nk) array per variable, None for shared and passive ones.
+        the values are interleaved into chunks of points one variable at a time.
+        '''
+        z = self.get_zone(zone)
+        if z.datapacking != __POINT__:
+            raise ValueError("zone {} is BLOCK packed, its variables are written by write_slab".format(
+                z.name))
+        stored = [var for var in range(self.nVars) if z.is_stored(var)]
+        arrays = {}
+        for var in stored:
+            array = np.asarray(vars[var])
+            if array.ndim < 3:
+                array = array.reshape((1,)*(3-array.ndim) + array.shape)
+            arrays[var] = array
+        nk = arrays[stored[0]].shape[2] if stored else 0
+        for var, array in arrays.items():
+            if array.shape != (z.imax, z.jmax, nk) or k_start < 0 or k_start+nk > z.kmax:
+                raise ValueError("slab of shape {} at k={:d} does not fit variable {} of shape {}".format(
+                    array.shape, k_start, self.varsName[var], (z.imax, z.jmax, z.kmax)))
+        if nk == 0:
+            return
+
+        with self.pltFile.timer('minmax'):
+            bounds = {var: _stored_bounds(array, z.variablesDtype[var]) for var, array in arrays.items()}
+            with self.minmaxLock:
+                for var, (vmin, vmax) in bounds.items():
+                    z.min_value[var] = min(z.min_value[var], vmin)
+                    z.max_value[var] = max(z.max_value[var], vmax)
+        with self.pltFile.timer('write'):
+            planePoints = z.imax*z.jmax
+            offset = z.dataOffset + k_start*planePoints*z.pointDtype.itemsize
+            if self.workers is None:
+                self.pltFile.seek(offset)
+            nkChunk = max(1, min(nk, __WRITE_CHUNK_BYTES__//(planePoints*z.pointDtype.itemsize)))
+            chunk = np.empty(planePoints*nkChunk, dtype=z.pointDtype)
+            for k0 in range(0, nk, nkChunk):
+                k1 = min(k0+nkChunk, nk)
+                points = chunk[0:planePoints*(k1-k0)]
+                for var, array in arrays.items():
+                    points[str(var)] = array[:, :, k0:k1].reshape(-1, order='F')
+                self.__write_array(points, z.pointDtype, offset + k0*planePoints*z.pointDtype.itemsize)
+
+    def write_slabs(self, var, slabs, k_start=0, zone=0):
+        '''
+        write consecutive slabs of a variable from an iterable, e.g. a generator
+        '''
+        for slab in slabs:
+            slab = np.asarray(slab)
+            self.write_slab(var, k_start, slab, zone=zone)
+            k_start += slab.shape[-1] if slab.ndim > 0 else 1
+
+    def close(self):
+        '''
+        write the accumulated min and max of the variables and close the file
+        '''
+        if self.pltFile.closed:
+            return
+        with self.pltFile.timer('close'):
+            for z in self.zone:
+                self.pltFile.seek(z.minmaxOffset)
+                self._write_minmax(z)
+            self.pltFile.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
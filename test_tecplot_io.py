@@ -1,5 +1,411 @@
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from tecplotIO import TecplotBinaryReader, TecplotBinaryWriter
+import io
+import os
+import json
+import stat
+import asyncio
+import pytest
+from tecplotIO import TecplotBinaryReader, TecplotBinaryWriter, reduce_series, append_zone, PltDataset, read_series, HandlePool, PltStats, \
+    build_pyramid, read_lod, \
+    open_plt, AsyncTecplotReader
+from tecplotIO.pltIndex import index_path, __INDEX_VERSION__
+from tecplotIO.pltFile import PltFile
+
+
+def test_concurrent_slabs_minmax(tmp_path):
+    path = str(tmp_path / 'slabs.plt')
+    shape = (4, 3, 16)
+    with TecplotBinaryWriter(path, varsName=['T'], shape=shape, dataFormat='d', workers=4) as writer:
+        with ThreadPoolExecutor(8) as executor:
+            list(executor.map(lambda k: writer.write_slab('T', 2*k, np.full((4, 3, 2), float(k))), range(8)))
+    with TecplotBinaryReader(path) as plt:
+        z = plt.zone[0]
+        assert z.min_value[0] == 0.0 and z.max_value[0] == 7.0
+        assert np.array_equal(z[0][0, 0, :], np.repeat(np.arange(8.0), 2))
+
+def test_workers_precondition(tmp_path, monkeypatch):
+    with pytest.raises(ValueError, match='requires a path'):
+        TecplotBinaryWriter(io.BytesIO(), varsName=['T'], shape=(2, 2, 2), workers=2)
+    path = str(tmp_path / 'kept.plt')
+    TecplotBinaryWriter(path, _grid((3, 2, 2)), dataFormat='d')
+    size = os.path.getsize(path)
+    monkeypatch.delattr(os, 'pwrite')
+    with pytest.raises(ValueError, match='os.pwrite'):
+        TecplotBinaryWriter(path, varsName=['T'], shape=(3, 2, 2), workers=2)
+    assert os.path.getsize(path) == size
+
+
+def test_zone_header_defaults(tmp_path):
+    path = str(tmp_path / 'zones.plt')
+    grid = _grid((3, 2, 2))
+    TecplotBinaryWriter(path, dataFormat='d', zoneName='mine', strandId=5, solutionTime=2.5,
+                        zones=[{'vars': grid}, {'vars': grid, 'name': 'b', 'strandId': 6}])
+    with TecplotBinaryReader(path) as plt:
+        assert plt.get_zone_names() == ['Zone 1', 'b']
+        assert [z.strand_id for z in plt.zone] == [5, 6]
+        assert [z.solutiontime for z in plt.zone] == [2.5, 2.5]
+
+
+def test_concurrent_stats(tmp_path):
+    path = str(tmp_path / 'stats.plt')
+    stats = PltStats()
+    with TecplotBinaryWriter(path, varsName=['T'], shape=(8, 8, 512), stats=stats, workers=8) as writer:
+        with ThreadPoolExecutor(8) as executor:
+            list(executor.map(lambda k: writer.write_slab('T', k, np.full((8, 8, 1), float(k))), range(512)))
+    # the min and max of the head section are written twice, the second time by close()
+    assert stats.bytesWritten == os.path.getsize(path) + 16
+    assert stats.calls['write'] == stats.calls['minmax'] == 512
+
+
+def test_reduce_constant_hist(tmp_path):
+    path = str(tmp_path / 'zero.plt')
+    TecplotBinaryWriter(path, [np.zeros((4, 3, 5))], dataFormat='d')
+    with TecplotBinaryReader(path, lazy=True) as plt:
+        counts, edges = plt.reduce(0, ops=('hist',), bins=4)['hist']
+    ref = np.histogram(np.zeros(60), bins=4)
+    assert np.array_equal(counts, ref[0]) and np.allclose(edges, ref[1])
+
+
+def test_pointwise_std_large_mean(tmp_path):
+    rng = np.random.default_rng(0)
+    paths = []
+    for t in range(50):
+        paths.append(str(tmp_path / 'snap{:02d}.plt'.format(t)))
+        TecplotBinaryWriter(paths[-1], [1e6 + 0.01*rng.standard_normal((8, 6, 5))], dataFormat='d')
+    stats = reduce_series(paths, 0, ops=('mean', 'std'), pointwise=True, chunkBytes=8*8*6*2)
+    assert stats['count'] == 50
+    assert np.allclose(stats['mean'], 1e6, atol=0.01)
+    assert 0.007 < stats['std'].mean() < 0.013
+
+
+def _grid(shape):
+    return [np.asarray(a, dtype=float) for a in np.meshgrid(*(np.arange(n) for n in shape), indexing='ij')]
+
+
+def _check_zone(z, vars):
+    for n, var in enumerate(vars):
+        if var is not None:
+            assert np.array_equal(z[n], var)
+            assert z.min_value[n] == var.min() and z.max_value[n] == var.max()
+
+
+def test_append_block(tmp_path):
+    path = str(tmp_path / 'block.plt')
+    shape = (4, 3, 5)
+    old = _grid(shape) + [np.arange(24.0).reshape((3, 2, 4))]
+    TecplotBinaryWriter(path, old, varsName=['x', 'y', 'z', 'T'], varsLoc=[0, 0, 0, 1], dataFormat='d')
+    new = [v + 10.0 for v in old]
+    append_zone(path, new, name='second', solutionTime=1.0)
+    with TecplotBinaryReader(path) as plt:
+        assert plt.get_zone_names() == ['Simple Zone', 'second']
+        _check_zone(plt.zone[0], old)
+        _check_zone(plt.zone[1], new)
+        assert plt.zone[1].solutiontime == 1.0
+
+
+def test_append_point(tmp_path):
+    path = str(tmp_path / 'point.plt')
+    old = _grid((4, 3, 5)) + [np.linspace(0.0, 1.0, 60).reshape((4, 3, 5))]
+    TecplotBinaryWriter(path, old, varsName=['x', 'y', 'z', 'p'], dataFormat='f', dataPacking='point')
+    new = [v*2.0 for v in old]
+    append_zone(path, new)
+    with TecplotBinaryReader(path) as plt:
+        assert plt.zone[0].datapacking == 1
+        _check_zone(plt.zone[0], [v.astype(np.float32) for v in old])
+        _check_zone(plt.zone[1], [v.astype(np.float32) for v in new])
+
+
+def test_append_shared_passive(tmp_path):
+    path = str(tmp_path / 'shared.plt')
+    grid = _grid((4, 3, 2))
+    old = grid + [np.full((4, 3, 2), 1.0), np.full((4, 3, 2), 2.0)]
+    TecplotBinaryWriter(path, old, varsName=['x', 'y', 'z', 'u', 'v'], dataFormat='d')
+    u = np.arange(24.0).reshape((4, 3, 2))
+    append_zone(path, [None, None, None, u, None], sharedVars={'x': 0, 'y': 0, 'z': 0}, passiveVars=['v'])
+    v = np.arange(24.0).reshape((4, 3, 2)) - 5.0
+    append_zone(path, [None, None, None, u + 1.0, v], sharedVars={'x': 0, 'y': 0, 'z': 0})
+    with TecplotBinaryReader(path) as plt:
+        _check_zone(plt.zone[0], old)
+        _check_zone(plt.zone[1], grid + [u, None])
+        assert plt.zone[1].passiveVariables[4]
+        _check_zone(plt.zone[2], grid + [u + 1.0, v])
+
+
+def test_append_keeps_link_and_mode(tmp_path):
+    path = str(tmp_path / 'data.plt')
+    link = str(tmp_path / 'link.plt')
+    TecplotBinaryWriter(path, _grid((3, 2, 2)), dataFormat='d')
+    os.chmod(path, 0o640)
+    os.symlink(path, link)
+    append_zone(link, _grid((3, 2, 2)))
+    assert os.path.islink(link)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+    assert sorted(os.listdir(str(tmp_path))) == ['data.plt', 'link.plt']
+    with TecplotBinaryReader(path) as plt:
+        assert len(plt.zone) == 2
+
+
+def test_dataset_concurrent_reads(tmp_path):
+    path = str(tmp_path / 'data.plt')
+    vars = [np.full((32, 16, 8), float(n)) + np.arange(8.0) for n in range(6)]
+    TecplotBinaryWriter(path, vars, dataFormat='d')
+    with PltDataset([path], cacheBytes=0) as ds:
+        with ThreadPoolExecutor(8) as executor:
+            arrays = list(executor.map(lambda n: ds[0, n % 6], range(96)))
+    for n, array in enumerate(arrays):
+        assert np.array_equal(array, vars[n % 6])
+
+
+def test_read_series_process(tmp_path):
+    paths = []
+    for t in range(4):
+        paths.append(str(tmp_path / 'snap{:d}.plt'.format(t)))
+        TecplotBinaryWriter(paths[-1], _grid((5, 4, 3)) + [np.full((5, 4, 3), float(t))],
+                            varsName=['x', 'y', 'z', 'p'], solutionTime=3.0-t, dataFormat='d')
+    keys, threaded = read_series(paths, backend='thread')
+    keys, fields = read_series(paths, workers=2, backend='process')
+    assert np.array_equal(keys, [0.0, 1.0, 2.0, 3.0])
+    for name in ['x', 'y', 'z', 'p']:
+        assert np.array_equal(fields[name], threaded[name])
+    assert np.array_equal(fields['p'][:, 0, 0, 0], [3.0, 2.0, 1.0, 0.0])
+    p = fields['p'][1]
+    del fields
+    assert np.array_equal(p, np.full((5, 4, 3), 2.0))
+
+
+def test_versions(tmp_path):
+    for packing, version in [('block', '#!TDV112'), ('point', '#!TDV111')]:
+        path = str(tmp_path / '{}.plt'.format(packing))
+        TecplotBinaryWriter(path, _grid((3, 2, 2)), dataFormat='d', dataPacking=packing)
+        with open(path, 'rb') as f:
+            data = bytearray(f.read())
+        with TecplotBinaryReader(bytes(data)) as plt:
+            assert plt.version == version
+            _check_zone(plt.zone[0], _grid((3, 2, 2)))
+        data[5:8] = b'110'
+        with pytest.raises(Exception, match='UnSupported Format'):
+            TecplotBinaryReader(bytes(data))
+
+
+def test_streaming_requires_variables(tmp_path):
+    with pytest.raises(ValueError, match='varsName or varsLoc'):
+        TecplotBinaryWriter(str(tmp_path / 'stream.plt'), shape=(3, 2, 2))
+    assert not os.path.exists(str(tmp_path / 'stream.plt'))
+    path = str(tmp_path / 'loc.plt')
+    with TecplotBinaryWriter(path, varsLoc=[0, 1], shape=(3, 2, 2), dataFormat='d') as writer:
+        writer.write_slab(0, 0, np.ones((3, 2, 2)))
+        writer.write_slab(1, 0, np.zeros((2, 1, 1)))
+    with TecplotBinaryReader(path) as plt:
+        assert plt.get_name_list() == ['V1', 'V2']
+        assert np.array_equal(plt.zone[0][0], np.ones((3, 2, 2)))
+
+
+def test_minmax_of_stored_data(tmp_path):
+    values = np.array([0.5, 2.7, 1.2, 0.1 + 1e-9])
+    for packing in ['block', 'point']:
+        path = str(tmp_path / '{}.plt'.format(packing))
+        TecplotBinaryWriter(path, [values, values, values.astype(np.int16), values],
+                            dataFormat=['i', 'f', 'auto', 'auto'], dataPacking=packing)
+        with TecplotBinaryReader(path) as plt:
+            z = plt.zone[0]
+            assert np.array_equal(z[0].ravel(), [0, 2, 1, 0])
+            assert [d.str for d in z.variablesDtype] == ['<i4', '<f4', '<i4', '<f8']
+            for n in range(4):
+                assert z.min_value[n] == z[n].min() and z.max_value[n] == z[n].max()
+
+
+def test_async_reader(tmp_path):
+    paths = [str(tmp_path / 'a{:d}.plt'.format(n)) for n in range(3)]
+    for n, path in enumerate(paths):
+        TecplotBinaryWriter(path, _grid((4, 3, 5)) + [np.full((3, 2, 4), float(n))],
+                            varsName=['x', 'y', 'z', 'T'], varsLoc=[0, 0, 0, 1], dataFormat='d')
+
+    async def main():
+        readers = await asyncio.gather(*[open_plt(path) for path in paths])
+        fields = await asyncio.gather(*[r.aread('T') for r in readers])
+        slab = await readers[0].aread_slab('x', i=slice(1, 3), k=slice(None, None, 2))
+        stats = await readers[2].areduce('T', ops=('mean', 'max'))
+        for r in readers:
+            await r.aclose()
+        async with AsyncTecplotReader(paths[1]) as r:
+            direct = await r.aread(0)
+        return fields, slab, stats, direct
+
+    fields, slab, stats, direct = asyncio.run(main())
+    for n, field in enumerate(fields):
+        assert np.array_equal(field, np.full((3, 2, 4), float(n)))
+    assert np.array_equal(slab, _grid((4, 3, 5))[0][1:3, :, ::2])
+    assert stats['mean'] == 2.0 and stats['max'] == 2.0
+    assert np.array_equal(direct, _grid((4, 3, 5))[0])
+
+
+def test_read_slab(tmp_path):
+    rng = np.random.default_rng(1)
+    grid = _grid((6, 5, 7))
+    T = rng.random((5, 4, 6))
+    p = rng.random((6, 5, 7)).astype(np.float32)
+    path = str(tmp_path / 'slab.plt')
+    TecplotBinaryWriter(path, varsName=['x', 'y', 'z', 'T', 'p'], dataFormat='auto', zones=[
+        {'vars': grid + [T, p], 'varsLoc': [0, 0, 0, 1, 0], 'name': 'block'},
+        {'vars': grid + [None, p], 'passiveVars': ['T'], 'dataPacking': 'point', 'name': 'point'}])
+    slices = [slice(None), slice(1, 4), slice(0, 1), slice(-2, None), slice(None, None, 2),
+              slice(4, 0, -1), slice(None, None, -3), slice(3, 3), slice(5, 100)]
+    with TecplotBinaryReader(path) as eager, TecplotBinaryReader(path, lazy=True) as lazy:
+        for zone, var in [('block', 'T'), ('block', 'p'), ('point', 'x'), ('point', 'p')]:
+            field = eager[zone, var]
+            for i in slices:
+                for j in slices:
+                    for k in slices:
+                        slab = lazy.read(var, i, j, k, zone=zone)
+                        assert slab.dtype == field.dtype
+                        assert np.array_equal(slab, field[i, j, k])
+
+
+def test_read_slab_full_planes(tmp_path):
+    path = str(tmp_path / 'planes.plt')
+    T = np.random.default_rng(3).random((5, 4, 6))
+    TecplotBinaryWriter(path, _grid((6, 5, 7)) + [T], varsLoc=[0, 0, 0, 1], dataFormat='d')
+    stats = PltStats()
+    with TecplotBinaryReader(path, lazy=True, stats=stats) as r:
+        for i, k in [(slice(None), slice(1, 5)), (slice(1, 3), slice(None))]:
+            stats.reset()
+            assert np.array_equal(r.read(3, i=i, k=k), T[i, :, k])
+            # the planes of cell-centered data are read at once with their ghost row
+            assert stats.reads == 1
+
+
+def test_shared_passive_zones(tmp_path):
+    grid = _grid((4, 3, 5))
+    u = [np.arange(60.0).reshape((4, 3, 5)) + n for n in range(3)]
+    T = [np.arange(24.0).reshape((3, 2, 4)) - n for n in range(3)]
+    path = str(tmp_path / 'shared.plt')
+    TecplotBinaryWriter(path, varsName=['x', 'y', 'z', 'u', 'T'], varsLoc=[0, 0, 0, 0, 1],
+                        dataFormat=['d', 'd', 'd', 'f', 'd'], zones=[
+                            {'vars': grid + [u[0], T[0]], 'name': 'a'},
+                            {'vars': [None, None, None, u[1], None], 'name': 'b',
+                             'sharedVars': {'x': 'a', 'y': 'a', 'z': 0}, 'passiveVars': ['T']},
+                            {'vars': [None, None, None, None, T[2]], 'name': 'c',
+                             'sharedVars': {'x': 'a', 'y': 'a', 'z': 'a', 'u': 'b'}}])
+    expected = {'a': grid + [u[0], T[0]], 'b': grid + [u[1], np.zeros((3, 2, 4))],
+                'c': grid + [u[1], T[2]]}
+    TecplotBinaryReader(path, index=True).close()
+    for mode in [{}, {'lazy': True}, {'mmap': True}, {'index': True}, {'index': True, 'lazy': True}]:
+        with TecplotBinaryReader(path, **mode) as r:
+            assert r.zone[1].sharingVariables[:3] == [0, 0, 0] and r.zone[1].passiveVariables[4]
+            assert r.zone[2].sharingVariables[3] == 1
+            assert r['b', 'x'] is r['a', 'x'] and r['c', 'u'] is r['b', 'u']
+            for name, vars in expected.items():
+                z = r.get_zone(name)
+                for n, var in enumerate(vars):
+                    assert np.array_equal(r[name, n], var)
+                    assert (z.min_value[n], z.max_value[n]) == (var.min(), var.max())
+            assert not r['b', 'T'].any() and r.zone[1].min_value[4] == r.zone[1].max_value[4] == 0.0
+
+
+def _edit_index(path, **changes):
+    with open(index_path(path)) as f:
+        entry = json.load(f)
+    entry.update(changes)
+    with open(index_path(path), 'w') as f:
+        json.dump(entry, f)
+
+
+def test_index_restore(tmp_path):
+    path = str(tmp_path / 'index.plt')
+    grid = _grid((4, 3, 3))
+    TecplotBinaryWriter(path, varsName=['x', 'y', 'z', 'T'], varsLoc=[0, 0, 0, 1], dataFormat='d', zones=[
+        {'vars': grid + [np.ones((3, 2, 2))], 'name': 'block'},
+        {'vars': grid + [None], 'varsLoc': [0]*4, 'passiveVars': ['T'], 'dataPacking': 'point'},
+        {'vars': [None, None, None, np.full((3, 2, 2), 2.0)], 'sharedVars': {'x': 0, 'y': 0, 'z': 0}}])
+    with TecplotBinaryReader(path) as parsed, TecplotBinaryReader(path, index=True) as built:
+        with TecplotBinaryReader(path, index=True) as restored:
+            for r in (built, restored):
+                assert (r.version, r.title, r.variablesName) == (parsed.version, parsed.title, parsed.variablesName)
+                assert (r.dataSectionOffset, r.dataSectionEnd) == (parsed.dataSectionOffset, parsed.dataSectionEnd)
+                for z, ref in zip(r.zone, parsed.zone):
+                    assert z.to_index() == ref.to_index()
+                    assert [d.str for d in z.variablesDtype] == [d.str for d in ref.variablesDtype]
+                    for n in range(4):
+                        assert np.array_equal(z[n], ref[n])
+            assert restored.zone[2][0] is restored.zone[0][0]
+
+
+def test_index_rebuild(tmp_path):
+    path = str(tmp_path / 'index.plt')
+    TecplotBinaryWriter(path, _grid((4, 3, 2)), dataFormat='d', title='first')
+    TecplotBinaryReader(path, index=True).close()
+    # an up to date index is used as it is
+    _edit_index(path, title='cached')
+    assert TecplotBinaryReader(path, index=True).title == 'cached'
+    # an index of another layout version is rebuilt
+    _edit_index(path, indexVersion=__INDEX_VERSION__-1)
+    assert TecplotBinaryReader(path, index=True).title == 'first'
+    with open(index_path(path)) as f:
+        assert json.load(f)['indexVersion'] == __INDEX_VERSION__
+    # so is the index of a file of another mtime, or of another size
+    _edit_index(path, title='cached')
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert TecplotBinaryReader(path, index=True).title == 'first'
+    TecplotBinaryWriter(path, _grid((5, 3, 2)), dataFormat='d', title='second')
+    with TecplotBinaryReader(path, index=True) as r:
+        assert r.title == 'second' and r.get_shape() == (5, 3, 2)
+        assert np.array_equal(r.zone[0][0], _grid((5, 3, 2))[0])
+
+
+def test_handle_pool(tmp_path):
+    paths = []
+    for n in range(5):
+        paths.append(str(tmp_path / 'pool{:d}.plt'.format(n)))
+        TecplotBinaryWriter(paths[-1], [np.full(shape, float(10*n + v)) for v, shape in
+                                        enumerate([(4, 3, 2), (4, 3, 2), (3, 2, 1)])],
+                            varsLoc=[0, 0, 1], dataFormat='d')
+    pool = HandlePool(1)
+    readers = [TecplotBinaryReader(path, lazy=True, pool=pool) for path in paths]
+    assert len(pool) <= 1
+    for v in [2, 0, 1]:
+        for n, r in enumerate(readers):
+            assert np.array_equal(r.read(v, k=slice(0, 1)), np.full(r.zone[0].variable_shape(v)[:2] + (1,), 10*n + v))
+            assert np.array_equal(r[0, v], np.full(r.zone[0].variable_shape(v), float(10*n + v)))
+            assert len(pool) <= 1
+    assert pool.opens >= 3*len(readers)
+    # an evicted file is reopened at its position
+    files = [PltFile(path, pool=pool) for path in paths[:2]]
+    assert [f.read_char(8) for f in files] == ['#!TDV112']*2
+    files[0].read_integer()
+    assert files[1].tell() == 8 and files[0].tell() == 12
+    assert len(pool) == 1
+    for f in files + readers:
+        f.close()
+    assert len(pool) == 0
+
+
+def test_pyramid(tmp_path):
+    path = str(tmp_path / 'lod.plt')
+    grid = _grid((9, 9, 5))
+    T = np.random.default_rng(2).random((8, 8, 4))
+    TecplotBinaryWriter(path, grid + [T], varsName=['x', 'y', 'z', 'T'], varsLoc=[0, 0, 0, 1], dataFormat='d')
+    build_pyramid(path, levels=2, chunkBytes=9*9*8)
+    for level, f in [(1, 2), (2, 4)]:
+        x, found = read_lod(path, 'x', target=(9//f + 1,)*2 + (4//f + 1,))
+        assert found == level and np.array_equal(x, grid[0][::f, ::f, ::f])
+        Tl, found = read_lod(path, 'T', target=(9//f + 1,)*2 + (4//f + 1,))
+        assert found == level
+        assert np.allclose(Tl, T.reshape((8//f, f, 8//f, f, 4//f, f)).mean(axis=(1, 3, 5)))
+    # the finest level meeting the target is the full resolution
+    assert read_lod(path, 'T', target=(9, 9, 5))[1] == 0
+    build_pyramid(path, variables=['x', 'y', 'z'], levels=1, method='decimate')
+    assert read_lod(path, 'z', target=(5, 5, 3))[1] == 1
+    # a sidecar without the variable or of another file version is not used
+    assert read_lod(path, 'T', target=(5, 5, 3))[1] == 0
+    TecplotBinaryWriter(path, grid + [T + 1.0], varsName=['x', 'y', 'z', 'T'], varsLoc=[0, 0, 0, 1],
+                        dataFormat='d', title='other')
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    x, found = read_lod(path, 'x', target=(5, 5, 3))
+    assert found == 0 and np.array_equal(x, grid[0])
+
 
 if __name__ == "__main__":
     # test write from user defined